@@ -34,7 +34,6 @@ import time
 from typing import Any, Optional, Sequence
 
 from absl import flags
-import jinja2
 from perfkitbenchmarker import context
 from perfkitbenchmarker import data
 from perfkitbenchmarker import errors
@@ -863,12 +862,11 @@ class KubernetesCluster(BaseContainerCluster):
       RunKubectlCommand(['apply', '-f', filename])
       return
 
-    environment = jinja2.Environment(undefined=jinja2.StrictUndefined)
-    with open(filename) as template_file, vm_util.NamedTemporaryFile(
+    template = vm_util.LoadJinjaTemplate(filename)
+    with vm_util.NamedTemporaryFile(
         mode='w', suffix='.yaml'
     ) as rendered_template:
-      manifest = environment.from_string(template_file.read()).render(kwargs)
-      rendered_template.write(manifest)
+      template.stream(kwargs).dump(rendered_template)
       rendered_template.close()
       RunKubectlCommand(['apply', '-f', rendered_template.name])
 
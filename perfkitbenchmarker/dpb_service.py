@@ -30,7 +30,6 @@ import tempfile
 from typing import Dict, List, Optional, Type
 
 from absl import flags
-import jinja2
 from perfkitbenchmarker import background_tasks
 from perfkitbenchmarker import container_service
 from perfkitbenchmarker import context
@@ -1281,12 +1280,11 @@ class KubernetesFlinkCluster(BaseDpbService):
   def _GenerateConfig(self, config_file, **kwargs):
     """Returns a temporary config file."""
     filename = data.ResourcePath(config_file)
-    environment = jinja2.Environment(undefined=jinja2.StrictUndefined)
-    with open(filename) as template_file, vm_util.NamedTemporaryFile(
+    template = vm_util.LoadJinjaTemplate(filename)
+    with vm_util.NamedTemporaryFile(
         mode='w', suffix='.yaml', dir=vm_util.GetTempDir(), delete=False
     ) as rendered_template:
-      config = environment.from_string(template_file.read()).render(kwargs)
-      rendered_template.write(config)
+      template.stream(kwargs).dump(rendered_template)
       rendered_template.close()
       logging.info('Finish generating config file %s', rendered_template.name)
       return rendered_template.name
@@ -162,7 +162,17 @@ class VmUtil(object):
     pass
 
   class CalledProcessException(Error):
-    pass
+    """A command run on the PKB host returned a non-zero exit code.
+
+    Attributes:
+      cmd: The command that was run, as a list of strings, if known.
+      stderr: The command's standard error, if known.
+    """
+
+    def __init__(self, message='', cmd=None, stderr=None):
+      super().__init__(message)
+      self.cmd = cmd
+      self.stderr = stderr
 
   class IssueCommandError(Error):
     pass
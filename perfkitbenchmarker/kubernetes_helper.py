@@ -16,7 +16,6 @@ import tempfile
 import time
 
 from absl import flags
-import jinja2
 from perfkitbenchmarker import data
 from perfkitbenchmarker import vm_util
 
@@ -44,29 +43,33 @@ def checkKubernetesFlags():
     )
 
 
-def CreateFromFile(file_name):
+def _RunKubectlOnManifest(action, file_name='-', stdin=None):
+  """Runs a kubectl create or delete on a manifest file or on stdin.
+
+  Args:
+    action: 'create' or 'delete'.
+    file_name: The manifest file. '-' makes kubectl read it from stdin.
+    stdin: The manifest, if it is read from stdin.
+  """
   checkKubernetesFlags()
-  create_cmd = [
+  cmd = [
       FLAGS.kubectl,
       '--kubeconfig=%s' % FLAGS.kubeconfig,
-      'create',
+      action,
       '-f',
       file_name,
   ]
-  vm_util.IssueRetryableCommand(create_cmd)
+  if action == 'delete':
+    cmd.append('--ignore-not-found')
+  vm_util.IssueRetryableCommand(cmd, stdin=stdin)
+
+
+def CreateFromFile(file_name):
+  _RunKubectlOnManifest('create', file_name)
 
 
 def DeleteFromFile(file_name):
-  checkKubernetesFlags()
-  delete_cmd = [
-      FLAGS.kubectl,
-      '--kubeconfig=%s' % FLAGS.kubeconfig,
-      'delete',
-      '-f',
-      file_name,
-      '--ignore-not-found',
-  ]
-  vm_util.IssueRetryableCommand(delete_cmd)
+  _RunKubectlOnManifest('delete', file_name)
 
 
 def DeleteAllFiles(file_list):
@@ -109,26 +112,20 @@ def GetWithWaitForContents(resource, resourceInstanceName, filter, jsonFilter):
 
 
 def CreateResource(resource_body):
-  with vm_util.NamedTemporaryFile(mode='w') as tf:
-    tf.write(resource_body)
-    tf.close()
-    CreateFromFile(tf.name)
+  """Creates the resource described by resource_body via kubectl's stdin."""
+  _RunKubectlOnManifest('create', stdin=resource_body)
 
 
 def DeleteResource(resource_body):
-  with vm_util.NamedTemporaryFile() as tf:
-    tf.write(resource_body)
-    tf.close()
-    DeleteFromFile(tf.name)
+  """Deletes the resource described by resource_body via kubectl's stdin."""
+  _RunKubectlOnManifest('delete', stdin=resource_body)
 
 
 def CreateRenderedManifestFile(filename, config):
   """Returns a file containing a rendered Jinja manifest (.j2) template."""
   manifest_filename = data.ResourcePath(filename)
-  environment = jinja2.Environment(undefined=jinja2.StrictUndefined)
-  with open(manifest_filename) as manifest_file:
-    manifest_template = environment.from_string(manifest_file.read())
+  manifest_template = vm_util.LoadJinjaTemplate(manifest_filename)
   rendered_yaml = tempfile.NamedTemporaryFile(mode='w')
-  rendered_yaml.write(manifest_template.render(config))
+  manifest_template.stream(config).dump(rendered_yaml)
   rendered_yaml.flush()
   return rendered_yaml
@@ -10,7 +10,6 @@ import time
 from typing import Callable, List, Optional, Tuple
 
 from absl import flags
-import jinja2
 from perfkitbenchmarker import data
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import virtual_machine
@@ -30,11 +29,7 @@ def PrepareBootScriptVM(aux_vm_ips: str, aux_vm_port: int) -> str:
   script_path = data.ResourcePath(
       os.path.join(DATA_DIR, BOOT_STARTUP_SCRIPT_TEMPLATE)
   )
-  with open(script_path) as fp:
-    template_str = fp.read()
-
-  environment = jinja2.Environment(undefined=jinja2.StrictUndefined)
-  template = environment.from_string(template_str)
+  template = vm_util.LoadJinjaTemplate(script_path)
   return template.render(port=aux_vm_port, ips=aux_vm_ips)
 
 
@@ -1409,6 +1409,7 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
       ip_address: Optional[str] = None,
       should_pre_log: bool = True,
       stack_level: int = 1,
+      stdin: Optional[str] = None,
   ) -> Tuple[str, str, int]:
     """Runs a command on the VM.
 
@@ -1428,6 +1429,7 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
       should_pre_log: Whether to output a "Running command" log statement.
       stack_level: Number of stack frames to skip & get an "interesting" caller,
         for logging. 1 skips this function, 2 skips this & its caller, etc..
+      stdin: Optional text written to the command's standard input.
 
     Returns:
       A tuple of stdout, stderr, return_code from running the command.
@@ -1473,6 +1475,7 @@ class BaseLinuxMixin(virtual_machine.BaseOsMixin):
             should_pre_log=False,
             raise_on_failure=False,
             stack_level=stack_level,
+            stdin=stdin,
         )
         # Retry on 255 because this indicates an SSH failure
         if retcode != RETRYABLE_SSH_RETCODE:
@@ -3038,7 +3041,13 @@ class ContainerizedDebianMixin(BaseDebianMixin):
     command = command.replace("'", r"'\''")
 
     logging.info('Docker running: %s', command, stacklevel=2)
-    command = "sudo docker exec %s bash -c '%s'" % (self.docker_id, command)
+    # docker exec only forwards stdin with -i.
+    interactive = '-i ' if kwargs.get('stdin') is not None else ''
+    command = "sudo docker exec %s%s bash -c '%s'" % (
+        interactive,
+        self.docker_id,
+        command,
+    )
     return self.RemoteHostCommand(command, **kwargs)
 
   def ContainerCopy(self, file_name, container_path='', copy_to=True):
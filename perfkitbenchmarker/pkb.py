@@ -784,6 +784,11 @@ def DoTeardownPhase(spec, collector, timer):
   logging.info('Tearing down resources for benchmark %s', spec.name)
   events.before_phase.send(stages.TEARDOWN, benchmark_spec=spec)
 
+  try:
+    vm_util.ShutdownSshMasters(spec.vms)
+  except Exception:  # pylint: disable=broad-except
+    # Closing ssh masters is best effort and must not block resource deletion.
+    logging.exception('Failed to shut down ssh master connections.')
   with timer.Measure('Resource Teardown'):
     spec.Delete()
 
@@ -871,6 +876,9 @@ def _PublishEventSample(
       spec,
   )
   collector.PublishSamples()
+  # Event samples are already marked as published, so upload any staged by
+  # --batch_publishing now; a passed-in collector may never be flushed.
+  collector.Flush()
 
 
 def _IsException(e: Exception, exception_class: Type[Exception]) -> bool:
@@ -1060,6 +1068,7 @@ def RunBenchmark(spec, collector):
           spec.Delete()
         if FLAGS.publish_after_run:
           collector.PublishSamples()
+          collector.Flush()
         events.benchmark_end.send(benchmark_spec=spec)
         # Pickle spec to save final resource state.
         spec.Pickle()
@@ -1498,6 +1507,7 @@ def RunBenchmarks():
   finally:
     if collector.samples:
       collector.PublishSamples()
+      collector.Flush()
     # Use the last run in the series of runs.
     if benchmark_spec_lists:
       benchmark_specs = [spec_list[-1] for spec_list in benchmark_spec_lists]
@@ -82,6 +82,7 @@ def GetDefaultUser():
   return result['core']['account']
 
 
+@functools.lru_cache()
 def GetRegionFromZone(zone) -> str:
   """Returns the region name from a fully-qualified zone name.
 
@@ -19,22 +19,29 @@
 
 import abc
 import collections
-import copy
+import contextlib
 import csv
 import datetime
 import fcntl
+import functools
+import gzip
 import itertools
 import json
 import logging
 import math
 import operator
+import os
 import pprint
+import re
 import sys
+import tempfile
+import threading
 import time
 from typing import Any
 import uuid
 
 from absl import flags
+from perfkitbenchmarker import background_tasks
 from perfkitbenchmarker import events
 from perfkitbenchmarker import flag_util
 from perfkitbenchmarker import log_util
@@ -46,6 +53,11 @@ import six
 from six.moves import urllib
 import six.moves.http_client as httplib
 
+try:
+  import orjson  # pytype: disable=import-error
+except ImportError:
+  orjson = None
+
 FLAGS = flags.FLAGS
 
 flags.DEFINE_string(
@@ -113,6 +125,16 @@ flags.DEFINE_string(
 )
 
 flags.DEFINE_string('gsutil_path', 'gsutil', 'path to the "gsutil" executable')
+flags.DEFINE_boolean(
+    'batch_publishing',
+    False,
+    'If true, the BigQuery and Cloud Storage publishers stage samples in a '
+    'local file each time samples are published and upload them with a '
+    'single "bq load" / "gsutil cp" when the sample collector is flushed at '
+    'the end of the benchmark, and the InfluxDB publisher buffers its writes '
+    'likewise. Useful with --publish_period, which otherwise issues one '
+    'upload per period.',
+)
 flags.DEFINE_string(
     'cloud_storage_bucket',
     None,
@@ -160,6 +182,13 @@ flags.DEFINE_string(
     'Name of Influx DB database that you wish to publish to or create',
 )
 
+flags.DEFINE_boolean(
+    'influx_gzip',
+    False,
+    'If true, gzip-compress the request bodies of InfluxDB writes. Requires '
+    'an InfluxDB server that accepts "Content-Encoding: gzip".',
+)
+
 flags.DEFINE_boolean(
     'record_log_publisher', True, 'Whether to use the log publisher or not.'
 )
@@ -177,6 +206,12 @@ EXTERNAL_PUBLISHERS = []
 # Used to publish samples in Pacific datetime
 _PACIFIC_TZ = pytz.timezone('US/Pacific')
 
+# Newline-delimited JSON serialized during SampleCollector.PublishSamples,
+# keyed by (id(samples), collapse_labels), with the samples list kept alongside
+# so that its id can't be reused by another list. Lets the JSON, BigQuery and
+# Cloud Storage publishers share one serialization of the same samples.
+_serialized_samples = threading.local()
+
 # metadata to list all entries instead of using a representative VM
 _VM_METADATA_TO_LIST_PLURAL = {
     'id': 'ids',
@@ -206,6 +241,7 @@ def PublishRunStageSamples(benchmark_spec, samples):
   collector = SampleCollector()
   collector.AddSamples(samples, benchmark_spec.name, benchmark_spec)
   collector.PublishSamples()
+  collector.Flush()
 
 
 # GetLabelsFromDict() and SampleLabelsToDict() currently encode/decode the label
@@ -213,6 +249,10 @@ def PublishRunStageSamples(benchmark_spec, samples):
 # specifically, certain combinations of the :/,/| characters can cause issues.
 # The encoding might change in the future if more robustness is needed.
 
+# Matches one 'k:v|' entry of an encoded labels string after its leading '|'.
+# The key runs to the first ':' and the value to the next '|,|' or final '|'.
+_LABEL_ENTRY_REGEX = re.compile(r'([^:]*):(.*?)\|(?:,\||\Z)', re.DOTALL)
+
 
 def GetLabelsFromDict(metadata: dict[Any, Any]) -> str:
   """Converts a metadata dictionary to a string of labels sorted by key.
@@ -223,10 +263,7 @@ def GetLabelsFromDict(metadata: dict[Any, Any]) -> str:
   Returns:
     A string of labels, sorted by key, in the format that Perfkit uses.
   """
-  labels = []
-  for k, v in sorted(six.iteritems(metadata)):
-    labels.append('|%s:%s|' % (k, v))
-  return ','.join(labels)
+  return ','.join(f'|{k!s}:{metadata[k]!s}|' for k in sorted(metadata))
 
 
 def LabelsToDict(labels_str: str) -> dict[str, str]:
@@ -241,9 +278,134 @@ def LabelsToDict(labels_str: str) -> dict[str, str]:
     A python dictionary mapping label names to contents.
   """
   # labels_str is of the form |k1:v1|,|k2:v2|.
-  entries = labels_str[1:-1].split('|,|')
-  split_entries = [s.split(':', 1) for s in entries]
-  return {k: v for k, v in split_entries}
+  return dict(_LABEL_ENTRY_REGEX.findall(labels_str, 1))
+
+
+# Built once rather than per json.dumps call. Compact separators and
+# unescaped non-ASCII characters match the output of orjson.
+_JSON_ENCODE = json.JSONEncoder(
+    separators=(',', ':'), ensure_ascii=False
+).encode
+
+
+def _HasNonFiniteFloat(obj) -> bool:
+  """Returns whether obj is or contains a NaN or infinite float."""
+  if isinstance(obj, float):
+    return not math.isfinite(obj)
+  if isinstance(obj, dict):
+    return any(_HasNonFiniteFloat(v) for v in obj.values())
+  if isinstance(obj, (list, tuple)):
+    return any(_HasNonFiniteFloat(v) for v in obj)
+  return False
+
+
+def _DumpJson(obj) -> str:
+  """Serializes obj to a JSON string, using orjson when it is installed.
+
+  orjson is considerably faster than the json module. Objects it cannot encode
+  fall back to the json module, as do objects containing NaN or infinite
+  floats, which orjson would silently write as null. The two spell some floats
+  differently, e.g. orjson writes 1e16 where json writes 1e+16, but both
+  decode to the same value.
+
+  Args:
+    obj: The object to serialize.
+
+  Returns:
+    The JSON encoding of obj.
+  """
+  if orjson is not None:
+    try:
+      encoded = orjson.dumps(
+          obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+      )
+    except TypeError:
+      pass
+    else:
+      # Non-finite floats can only have produced a null, so most samples skip
+      # the walk.
+      if b'null' not in encoded or not _HasNonFiniteFloat(obj):
+        return encoded.decode()
+  return _JSON_ENCODE(obj)
+
+
+def _LoadJson(s):
+  """Deserializes a JSON string, using orjson when it is installed.
+
+  Input orjson rejects, such as the NaN literals written by the json module,
+  falls back to json.loads.
+
+  Args:
+    s: string. The JSON document.
+
+  Returns:
+    The decoded object.
+  """
+  if orjson is not None:
+    try:
+      return orjson.loads(s)
+    except orjson.JSONDecodeError:
+      pass
+  return json.loads(s)
+
+
+def _SamplesToNewlineDelimitedJSON(samples, collapse_labels):
+  """Serializes samples to newline-delimited JSON.
+
+  Within a _ShareSerializedSamples block the result is reused for later calls
+  with the same samples list.
+
+  Args:
+    samples: list of sample dicts.
+    collapse_labels: boolean. If true, metadata is converted to a flat string
+      with key 'labels' via GetLabelsFromDict.
+
+  Returns:
+    The serialized samples, one JSON object per line.
+  """
+  cache = getattr(_serialized_samples, 'cache', None)
+  key = (id(samples), collapse_labels)
+  if cache is not None and key in cache:
+    cached_samples, serialized = cache[key]
+    if cached_samples is samples:
+      return serialized
+  lines = []
+  for sample in samples:
+    # Samples are shared with other publishers, so they are never modified in
+    # place; a new dict is only needed when metadata is replaced by labels.
+    if collapse_labels:
+      labels = GetLabelsFromDict(sample.get('metadata', {}))
+      sample = {k: v for k, v in sample.items() if k != 'metadata'}
+      sample['labels'] = labels
+    lines.append(_DumpJson(sample))
+    lines.append('\n')
+  serialized = ''.join(lines)
+  if cache is not None:
+    cache[key] = (samples, serialized)
+  return serialized
+
+
+@contextlib.contextmanager
+def _ShareSerializedSamples(cache=None):
+  """Reuses newline-delimited JSON serializations within the block.
+
+  Samples must not be modified while the block is active.
+
+  Args:
+    cache: dict. Cache yielded by an enclosing block, possibly on another
+      thread, to keep sharing. A new cache is used if None.
+
+  Yields:
+    The cache dict.
+  """
+  if cache is None:
+    cache = {}
+  previous = getattr(_serialized_samples, 'cache', None)
+  _serialized_samples.cache = cache
+  try:
+    yield cache
+  finally:
+    _serialized_samples.cache = previous
 
 
 class MetadataProvider(six.with_metaclass(abc.ABCMeta, object)):
@@ -265,6 +427,19 @@ class MetadataProvider(six.with_metaclass(abc.ABCMeta, object)):
     raise NotImplementedError()
 
 
+@functools.lru_cache(maxsize=1)
+def _ParseUserMetadata(metadata_flag_values):
+  """Returns --metadata parsed into a dict.
+
+  Cached since --metadata does not change during a run. The result is shared
+  between callers and must not be modified.
+
+  Args:
+    metadata_flag_values: tuple of --metadata values.
+  """
+  return flag_util.ParseKeyValuePairs(metadata_flag_values)
+
+
 class DefaultMetadataProvider(MetadataProvider):
   """Adds default metadata to samples."""
 
@@ -292,6 +467,15 @@ class DefaultMetadataProvider(MetadataProvider):
       for k, v in six.iteritems(tpu.GetResourceMetadata()):
         metadata['tpu_' + k] = v
 
+    # GetResourceMetadata is called for every VM below, some more than once, so
+    # fetch each VM's metadata only once.
+    vm_resource_metadata = {}
+
+    def _GetVmResourceMetadata(vm):
+      if vm not in vm_resource_metadata:
+        vm_resource_metadata[vm] = vm.GetResourceMetadata()
+      return vm_resource_metadata[vm]
+
     for name, vms in six.iteritems(benchmark_spec.vm_groups):
       if len(vms) == 0:
         continue
@@ -300,7 +484,7 @@ class DefaultMetadataProvider(MetadataProvider):
       # machine type, and image.
       vm = vms[-1]
       name_prefix = '' if name == 'default' else name + '_'
-      for k, v in six.iteritems(vm.GetResourceMetadata()):
+      for k, v in six.iteritems(_GetVmResourceMetadata(vm)):
         if k not in _VM_METADATA_TO_LIST_PLURAL:
           metadata[name_prefix + k] = v
       metadata[name_prefix + 'vm_count'] = len(vms)
@@ -322,12 +506,14 @@ class DefaultMetadataProvider(MetadataProvider):
       # since id and name are generic metadata prefix vm, so it is clear
       # what the resource is.
       name_prefix += 'vm_'
-      for key, key_plural in _VM_METADATA_TO_LIST_PLURAL.items():
-        values = []
-        for vm in vms:
-          if value := vm.GetResourceMetadata().get(key):
+      values_by_key = {key: [] for key in _VM_METADATA_TO_LIST_PLURAL}
+      for vm in vms:
+        vm_metadata = _GetVmResourceMetadata(vm)
+        for key, values in values_by_key.items():
+          if value := vm_metadata.get(key):
             values.append(value)
-        if values:
+      for key, key_plural in _VM_METADATA_TO_LIST_PLURAL.items():
+        if values := values_by_key[key]:
           metadata[name_prefix + key_plural] = ','.join(values)
 
     if FLAGS.set_files:
@@ -338,8 +524,7 @@ class DefaultMetadataProvider(MetadataProvider):
     # Flatten all user metadata into a single list (since each string in the
     # FLAGS.metadata can actually be several key-value pairs) and then iterate
     # over it.
-    parsed_metadata = flag_util.ParseKeyValuePairs(FLAGS.metadata)
-    metadata.update(parsed_metadata)
+    metadata.update(_ParseUserMetadata(tuple(FLAGS.metadata)))
     return metadata
 
 
@@ -351,6 +536,9 @@ class SamplePublisher(six.with_metaclass(abc.ABCMeta, object)):
 
   # Time series data is long. Turn this flag off to hide time series data.
   PUBLISH_CONSOLE_LOG_DATA = True
+  # Publishers that mostly wait on network or subprocess I/O set this so that
+  # SampleCollector runs them concurrently with each other.
+  PUBLISH_IN_BACKGROUND = False
 
   @abc.abstractmethod
   def PublishSamples(self, samples: list[pkb_sample.SampleDict]):
@@ -365,6 +553,13 @@ class SamplePublisher(six.with_metaclass(abc.ABCMeta, object)):
     """
     raise NotImplementedError()
 
+  def Flush(self):
+    """Publishes any samples buffered by previous PublishSamples calls.
+
+    Publishers which write samples out immediately do not need to override
+    this.
+    """
+
 
 class CSVPublisher(SamplePublisher):
   """Publisher which writes results in CSV format to a specified path.
@@ -391,22 +586,32 @@ class CSVPublisher(SamplePublisher):
     self._path = path
 
   def PublishSamples(self, samples):
-    samples = list(samples)
+    # The header needs every metadata key, so samples are walked twice. Only
+    # materialize them if they were not already given as a list.
+    if not isinstance(samples, list):
+      samples = list(samples)
     # Union of all metadata keys.
-    meta_keys = sorted(
-        set(key for sample in samples for key in sample['metadata'])
-    )
+    meta_keys = set()
+    for sample in samples:
+      meta_keys.update(sample['metadata'])
+    meta_keys = sorted(meta_keys)
 
     logging.info('Writing CSV results to %s', self._path)
     with open(self._path, 'w') as fp:
-      writer = csv.DictWriter(fp, list(self._DEFAULT_FIELDS) + meta_keys)
-      writer.writeheader()
+      writer = csv.writer(fp)
+      writer.writerow(list(self._DEFAULT_FIELDS) + meta_keys)
 
+      # Rows are built as lists in header order, which skips the per-field
+      # dict lookups csv.DictWriter does for every row.
       for sample in samples:
-        d = {}
-        d.update(sample)
-        d.update(d.pop('metadata'))
-        writer.writerow(d)
+        metadata = sample['metadata']
+        row = [sample.get(field, '') for field in self._DEFAULT_FIELDS]
+        row.extend(metadata.get(key, '') for key in meta_keys)
+        writer.writerow(row)
+
+
+# Format of a single sample line in PrettyPrintStreamPublisher output.
+_PRETTY_PRINT_SAMPLE_FORMAT = '  {0:<30s} {1:>15f} {2:<30s}'
 
 
 class PrettyPrintStreamPublisher(SamplePublisher):
@@ -458,21 +663,21 @@ class PrettyPrintStreamPublisher(SamplePublisher):
       value.
     """
     unique_values = {}
+    # Number of samples each key appears in. A key missing from any sample
+    # cannot be constant.
+    key_counts = collections.Counter()
 
     for sample in samples:
       for k, v in six.iteritems(sample['metadata']):
+        key_counts[k] += 1
         if len(unique_values.setdefault(k, set())) < 2 and v.__hash__:
           unique_values[k].add(v)
 
-    # Find keys which are not present in all samples
-    for sample in samples:
-      for k in frozenset(unique_values) - frozenset(sample['metadata']):
-        unique_values[k].add(None)
-
+    num_samples = len(samples)
     return frozenset(
         k
         for k, v in six.iteritems(unique_values)
-        if len(v) == 1 and None not in v
+        if key_counts[k] == num_samples and len(v) == 1 and None not in v
     )
 
   def _FormatMetadata(self, metadata):
@@ -482,19 +687,18 @@ class PrettyPrintStreamPublisher(SamplePublisher):
     )
 
   def PublishSamples(self, samples):
-    # result will store the formatted text, then be emitted to self.stream and
-    # logged.
-    result = six.StringIO()
+    # result will store the formatted text fragments, then be joined, emitted
+    # to self.stream and logged.
+    result = []
     dashes = '-' * 25
-    result.write(
+    result.append(
         '\n' + dashes + 'PerfKitBenchmarker Results Summary' + dashes + '\n'
     )
 
     if not samples:
-      logging.debug(
-          'Pretty-printing results to %s:\n%s', self.stream, result.getvalue()
-      )
-      self.stream.write(result.getvalue())
+      value = ''.join(result)
+      logging.debug('Pretty-printing results to %s:\n%s', self.stream, value)
+      self.stream.write(value)
       return
 
     key = operator.itemgetter('test')
@@ -518,37 +722,41 @@ class PrettyPrintStreamPublisher(SamplePublisher):
           for k, v in six.iteritems(test_samples[0]['metadata'])
           if k in locally_constant_keys
       }
-      result.write('{0}:\n'.format(benchmark.upper()))
+      result.append('{0}:\n'.format(benchmark.upper()))
 
       if benchmark_meta:
-        result.write('  {0}\n'.format(self._FormatMetadata(benchmark_meta)))
+        result.append('  {0}\n'.format(self._FormatMetadata(benchmark_meta)))
 
       for sample in test_samples:
-        meta = {
-            k: v
-            for k, v in six.iteritems(sample['metadata'])
-            if k not in all_constant_meta
-        }
-        result.write(
-            '  {0:<30s} {1:>15f} {2:<30s}'.format(
+        sample_meta = sample['metadata']
+        if all_constant_meta:
+          meta = {
+              k: v
+              for k, v in six.iteritems(sample_meta)
+              if k not in all_constant_meta
+          }
+        else:
+          meta = sample_meta
+        result.append(
+            _PRETTY_PRINT_SAMPLE_FORMAT.format(
                 sample['metric'], sample['value'], sample['unit']
             )
         )
         if meta:
-          result.write(' ({0})'.format(self._FormatMetadata(meta)))
-        result.write('\n')
+          result.append(' ({0})'.format(self._FormatMetadata(meta)))
+        result.append('\n')
 
     global_meta = {
         k: v
         for k, v in six.iteritems(samples[0]['metadata'])
         if k in globally_constant_keys
     }
-    result.write('\n' + dashes + '\n')
-    result.write(
+    result.append('\n' + dashes + '\n')
+    result.append(
         'For all tests: {0}\n'.format(self._FormatMetadata(global_meta))
     )
 
-    value = result.getvalue()
+    value = ''.join(result)
     logging.debug('Pretty-printing results to %s:\n%s', self.stream, value)
     self.stream.write(value)
 
@@ -610,13 +818,67 @@ class NewlineDelimitedJSONPublisher(SamplePublisher):
 
   def PublishSamples(self, samples):
     logging.info('Publishing %d samples to %s', len(samples), self.file_path)
+    # Serialize everything up front so the file is written in a single call
+    # rather than once per sample.
+    serialized = _SamplesToNewlineDelimitedJSON(samples, self.collapse_labels)
     with open(self.file_path, self.mode) as fp:
-      fcntl.flock(fp, fcntl.LOCK_EX)
-      for sample in samples:
-        sample = sample.copy()
-        if self.collapse_labels:
-          sample['labels'] = GetLabelsFromDict(sample.pop('metadata', {}))
-        fp.write(json.dumps(sample) + '\n')
+      # Only appends can be shared safely with other runs writing to the same
+      # file; any other mode replaces its contents, so locking buys nothing.
+      if 'a' in self.mode:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+      fp.write(serialized)
+
+
+class _SampleStagingFile:
+  """Accumulates samples in a local newline-delimited JSON file.
+
+  Used by publishers that upload through a command line tool so that several
+  PublishSamples calls can share a single upload. The file is kept open for
+  appending between flushes.
+
+  Attributes:
+    prefix: string. Prefix of the staging file name.
+    num_samples: int. Number of samples staged since the last flush.
+  """
+
+  def __init__(self, prefix):
+    self.prefix = prefix
+    self.num_samples = 0
+    self._file = None
+
+  def Add(self, samples):
+    """Appends 'samples' to the staging file, creating it if needed."""
+    if self._file is None:
+      self._file = tempfile.NamedTemporaryFile(
+          mode='w',
+          prefix=self.prefix,
+          dir=vm_util.GetTempDir(),
+          suffix='.json',
+          delete=False,
+      )
+    self._file.write(
+        _SamplesToNewlineDelimitedJSON(samples, collapse_labels=True)
+    )
+    self.num_samples += len(samples)
+
+  def Flush(self, upload_fn):
+    """Uploads the staged samples via upload_fn and removes the file.
+
+    Args:
+      upload_fn: function taking the staging file path and the number of
+        staged samples.
+    """
+    if self._file is None:
+      return
+    staging_file, num_samples = self._file, self.num_samples
+    self._file = None
+    self.num_samples = 0
+    try:
+      staging_file.close()
+      if num_samples:
+        upload_fn(staging_file.name, num_samples)
+    finally:
+      os.remove(staging_file.name)
 
 
 class BigQueryPublisher(SamplePublisher):
@@ -633,8 +895,12 @@ class BigQueryPublisher(SamplePublisher):
       private key. Must be specified if service_account is specified.
     application_default_credential_file: Filename that holds Google applciation
       default credentials. Cannot be set alongside service_account.
+    batch: boolean. If true, stage samples locally and only load them into
+      BigQuery on Flush.
   """
 
+  PUBLISH_IN_BACKGROUND = True
+
   def __init__(
       self,
       bigquery_table,
@@ -643,6 +909,7 @@ class BigQueryPublisher(SamplePublisher):
       service_account=None,
       service_account_private_key_file=None,
       application_default_credential_file=None,
+      batch=False,
   ):
     super().__init__()
     self.bigquery_table = bigquery_table
@@ -654,6 +921,8 @@ class BigQueryPublisher(SamplePublisher):
     self.application_default_credential_file = (
         application_default_credential_file
     )
+    self.batch = batch
+    self._staging_file = _SampleStagingFile('perfkit-bq-pub')
 
     if (self.service_account is None) != (
         self.service_account_private_key_file is None
@@ -679,6 +948,10 @@ class BigQueryPublisher(SamplePublisher):
       logging.warning('No samples: not publishing to BigQuery')
       return
 
+    if self.batch:
+      self._staging_file.Add(samples)
+      return
+
     with vm_util.NamedTemporaryFile(
         prefix='perfkit-bq-pub', dir=vm_util.GetTempDir(), suffix='.json'
     ) as tf:
@@ -687,33 +960,40 @@ class BigQueryPublisher(SamplePublisher):
       )
       json_publisher.PublishSamples(samples)
       tf.close()
-      logging.info(
-          'Publishing %d samples to %s', len(samples), self.bigquery_table
-      )
-      load_cmd = [self.bq_path]
-      if self.project_id:
-        load_cmd.append('--project_id=' + self.project_id)
-      if self.service_account:
-        assert self.service_account_private_key_file is not None
-        load_cmd.extend([
-            '--service_account=' + self.service_account,
-            '--service_account_credential_file=' + self._credentials_file,
-            '--service_account_private_key_file='
-            + self.service_account_private_key_file,
-        ])
-      elif self.application_default_credential_file is not None:
-        load_cmd.append(
-            '--application_default_credential_file='
-            + self.application_default_credential_file
-        )
+      self._Load(tf.name, len(samples))
+
+  def Flush(self):
+    self._staging_file.Flush(self._Load)
+
+  def _Load(self, json_path, num_samples):
+    """Loads newline-delimited JSON samples from json_path into BigQuery."""
+    logging.info(
+        'Publishing %d samples to %s', num_samples, self.bigquery_table
+    )
+    load_cmd = [self.bq_path]
+    if self.project_id:
+      load_cmd.append('--project_id=' + self.project_id)
+    if self.service_account:
+      assert self.service_account_private_key_file is not None
       load_cmd.extend([
-          'load',
-          '--autodetect',
-          '--source_format=NEWLINE_DELIMITED_JSON',
-          self.bigquery_table,
-          tf.name,
+          '--service_account=' + self.service_account,
+          '--service_account_credential_file=' + self._credentials_file,
+          '--service_account_private_key_file='
+          + self.service_account_private_key_file,
       ])
-      vm_util.IssueRetryableCommand(load_cmd)
+    elif self.application_default_credential_file is not None:
+      load_cmd.append(
+          '--application_default_credential_file='
+          + self.application_default_credential_file
+      )
+    load_cmd.extend([
+        'load',
+        '--autodetect',
+        '--source_format=NEWLINE_DELIMITED_JSON',
+        self.bigquery_table,
+        json_path,
+    ])
+    vm_util.IssueRetryableCommand(load_cmd)
 
 
 class CloudStoragePublisher(SamplePublisher):
@@ -731,11 +1011,19 @@ class CloudStoragePublisher(SamplePublisher):
     bucket: string. The GCS bucket name to publish to.
     gsutil_path: string. The path to the 'gsutil' tool.
     sub_folder: Optional folder within the bucket to publish to.
+    batch: boolean. If true, stage samples locally and only copy them to the
+      bucket on Flush.
   """
 
-  def __init__(self, bucket, gsutil_path='gsutil', sub_folder=None):
+  PUBLISH_IN_BACKGROUND = True
+
+  def __init__(
+      self, bucket, gsutil_path='gsutil', sub_folder=None, batch=False
+  ):
     super().__init__()
     self.gsutil_path = gsutil_path
+    self.batch = batch
+    self._staging_file = _SampleStagingFile('perfkit-gcs-pub')
     if sub_folder:
       self.gcs_directory = f'gs://{bucket}/{sub_folder}'
     else:
@@ -749,17 +1037,119 @@ class CloudStoragePublisher(SamplePublisher):
     return object_name[:GCS_OBJECT_NAME_LENGTH]
 
   def PublishSamples(self, samples):
+    if self.batch:
+      self._staging_file.Add(samples)
+      return
+
     with vm_util.NamedTemporaryFile(
         prefix='perfkit-gcs-pub', dir=vm_util.GetTempDir(), suffix='.json'
     ) as tf:
       json_publisher = NewlineDelimitedJSONPublisher(tf.name)
       json_publisher.PublishSamples(samples)
       tf.close()
-      object_name = self._GenerateObjectName()
-      storage_uri = f'{self.gcs_directory}/{object_name}'
-      logging.info('Publishing %d samples to %s', len(samples), storage_uri)
-      copy_cmd = [self.gsutil_path, 'cp', tf.name, storage_uri]
-      vm_util.IssueRetryableCommand(copy_cmd)
+      self._Copy(tf.name, len(samples))
+
+  def Flush(self):
+    self._staging_file.Flush(self._Copy)
+
+  def _Copy(self, json_path, num_samples):
+    """Copies newline-delimited JSON samples from json_path to the bucket."""
+    object_name = self._GenerateObjectName()
+    storage_uri = f'{self.gcs_directory}/{object_name}'
+    logging.info('Publishing %d samples to %s', num_samples, storage_uri)
+    copy_cmd = [self.gsutil_path, 'cp', json_path, storage_uri]
+    vm_util.IssueRetryableCommand(copy_cmd)
+
+
+# Default index mappings for Elasticsearch >= 5.0.0.
+_ES_MAPPING_5_PLUS = {
+    'mappings': {
+        'result': {
+            'numeric_detection': True,
+            'properties': {
+                'timestamp': {
+                    'type': 'date',
+                    'format': 'yyyy-MM-dd HH:mm:ss.SSSSSS',
+                },
+                'value': {'type': 'double'},
+            },
+            'dynamic_templates': [{
+                'strings': {
+                    'match_mapping_type': 'string',
+                    'mapping': {
+                        'type': 'text',
+                        'fields': {
+                            'raw': {
+                                'type': 'keyword',
+                                'ignore_above': 256,
+                            }
+                        },
+                    },
+                }
+            }],
+        }
+    }
+}
+
+# Default index mappings for Elasticsearch < 5.0.0.
+_ES_MAPPING_BEFORE_5 = {
+    'mappings': {
+        'result': {
+            'numeric_detection': True,
+            'properties': {
+                'timestamp': {
+                    'type': 'date',
+                    'format': 'yyyy-MM-dd HH:mm:ss.SSSSSS',
+                },
+                'value': {'type': 'double'},
+            },
+            'dynamic_templates': [{
+                'strings': {
+                    'match_mapping_type': 'string',
+                    'mapping': {
+                        'type': 'string',
+                        'fields': {
+                            'raw': {
+                                'type': 'string',
+                                'index': 'not_analyzed',
+                            }
+                        },
+                    },
+                }
+            }],
+        }
+    }
+}
+
+
+# Samples per Elasticsearch bulk request, and bulk requests sent concurrently.
+_ES_BULK_CHUNK_SIZE = 500
+_ES_BULK_THREAD_COUNT = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _ImportElasticsearch():
+  """Imports the Elasticsearch client on first use.
+
+  The import is deferred so that the package is only required when the
+  Elasticsearch publisher is used, and is resolved once per process.
+
+  Returns:
+    A tuple of the elasticsearch.Elasticsearch class and the
+    elasticsearch.helpers module.
+  """
+  try:
+    # pylint:disable=g-import-not-at-top
+    from elasticsearch import Elasticsearch  # pytype: disable=import-error
+    from elasticsearch import helpers  # pytype: disable=import-error
+    # pylint:enable=g-import-not-at-top
+  except ImportError:
+    raise ImportError(
+        'The "elasticsearch" package is required to use '
+        'the Elasticsearch publisher. Please make sure it '
+        'is installed.'
+    )
+  return Elasticsearch, helpers
 
 
 class ElasticsearchPublisher(SamplePublisher):
@@ -771,117 +1161,88 @@ class ElasticsearchPublisher(SamplePublisher):
     es_uri: String. e.g. "http://localhost:9200"
     es_index: String. Default "perfkit"
     es_type: String. Default "result"
+    json_dumps: Function serializing a sample dict to a JSON string. Defaults
+      to _DumpJson, which writes compact JSON with non-ASCII characters left
+      unescaped and NaN/Infinity kept as is. A custom encoder must handle the
+      same value types as the default.
   """
 
-  def __init__(self, es_uri=None, es_index=None, es_type=None):
+  PUBLISH_IN_BACKGROUND = True
+
+  def __init__(
+      self, es_uri=None, es_index=None, es_type=None, json_dumps=None
+  ):
     super().__init__()
     self.es_uri = es_uri
     self.es_index = es_index.lower()
     self.es_type = es_type
-    self.mapping_5_plus = {
-        'mappings': {
-            'result': {
-                'numeric_detection': True,
-                'properties': {
-                    'timestamp': {
-                        'type': 'date',
-                        'format': 'yyyy-MM-dd HH:mm:ss.SSSSSS',
-                    },
-                    'value': {'type': 'double'},
-                },
-                'dynamic_templates': [{
-                    'strings': {
-                        'match_mapping_type': 'string',
-                        'mapping': {
-                            'type': 'text',
-                            'fields': {
-                                'raw': {
-                                    'type': 'keyword',
-                                    'ignore_above': 256,
-                                }
-                            },
-                        },
-                    }
-                }],
-            }
-        }
-    }
-
-    self.mapping_before_5 = {
-        'mappings': {
-            'result': {
-                'numeric_detection': True,
-                'properties': {
-                    'timestamp': {
-                        'type': 'date',
-                        'format': 'yyyy-MM-dd HH:mm:ss.SSSSSS',
-                    },
-                    'value': {'type': 'double'},
-                },
-                'dynamic_templates': [{
-                    'strings': {
-                        'match_mapping_type': 'string',
-                        'mapping': {
-                            'type': 'string',
-                            'fields': {
-                                'raw': {
-                                    'type': 'string',
-                                    'index': 'not_analyzed',
-                                }
-                            },
-                        },
-                    }
-                }],
-            }
-        }
-    }
+    self.json_dumps = json_dumps or _DumpJson
+    # Whether the index is known to exist, so that later publishes can skip
+    # the existence check.
+    self._index_ready = False
 
   def PublishSamples(self, samples):
     """Publish samples to Elasticsearch service."""
-    try:
-      # pylint:disable=g-import-not-at-top
-      from elasticsearch import Elasticsearch  # pytype: disable=import-error
-      # pylint:enable=g-import-not-at-top
-    except ImportError:
-      raise ImportError(
-          'The "elasticsearch" package is required to use '
-          'the Elasticsearch publisher. Please make sure it '
-          'is installed.'
-      )
+    elasticsearch_class, helpers = _ImportElasticsearch()
+    es = elasticsearch_class([self.es_uri])
+    if not self._index_ready:
+      self._CreateIndexIfMissing(es)
+      self._index_ready = True
+    # All samples go out in bulk requests instead of one request per sample,
+    # with several requests in flight at once when there are many samples.
+    # parallel_bulk is lazy and raises on the first failed document, so its
+    # results only need to be drained.
+    collections.deque(
+        helpers.parallel_bulk(
+            es,
+            self._BulkActions(samples),
+            thread_count=_ES_BULK_THREAD_COUNT,
+            chunk_size=_ES_BULK_CHUNK_SIZE,
+        ),
+        maxlen=0,
+    )
 
-    es = Elasticsearch([self.es_uri])
-    if not es.indices.exists(index=self.es_index):
-      # choose whether to use old or new mapings based on
-      # the version of elasticsearch that is being used
-      if int(es.info()['version']['number'].split('.')[0]) >= 5:
-        es.indices.create(index=self.es_index, body=self.mapping_5_plus)
-        logging.info(
-            'Create index %s and default mappings for'
-            ' elasticsearch version >= 5.0.0',
-            self.es_index,
-        )
-      else:
-        es.indices.create(index=self.es_index, body=self.mapping_before_5)
-        logging.info(
-            'Create index %s and default mappings for'
-            ' elasticsearch version < 5.0.0',
-            self.es_index,
-        )
+  def _BulkActions(self, samples):
+    """Yields a bulk create action for each sample."""
     for s in samples:
-      sample = copy.deepcopy(s)
+      # Keys cannot have dots for ES. _deDotKeys returns a copy, so the shared
+      # sample is left untouched.
+      sample = self._deDotKeys(s)
       # Make timestamp understandable by ES and human.
       sample['timestamp'] = self._FormatTimestampForElasticsearch(
-          sample['timestamp']
+          s['timestamp']
       )
-      # Keys cannot have dots for ES
-      sample = self._deDotKeys(sample)
       # Add sample to the "perfkit index" of "result type" and using sample_uri
       # as each ES's document's unique _id
-      es.create(
-          index=self.es_index,
-          doc_type=self.es_type,
-          id=sample['sample_uri'],
-          body=json.dumps(sample),
+      yield {
+          '_op_type': 'create',
+          '_index': self.es_index,
+          '_type': self.es_type,
+          '_id': sample['sample_uri'],
+          # Serialized here rather than by the client so that json_dumps is
+          # used.
+          '_source': self.json_dumps(sample),
+      }
+
+  def _CreateIndexIfMissing(self, es):
+    """Creates the index with default mappings if it does not exist yet."""
+    if es.indices.exists(index=self.es_index):
+      return
+    # choose whether to use old or new mapings based on
+    # the version of elasticsearch that is being used
+    if int(es.info()['version']['number'].split('.')[0]) >= 5:
+      es.indices.create(index=self.es_index, body=_ES_MAPPING_5_PLUS)
+      logging.info(
+          'Create index %s and default mappings for'
+          ' elasticsearch version >= 5.0.0',
+          self.es_index,
+      )
+    else:
+      es.indices.create(index=self.es_index, body=_ES_MAPPING_BEFORE_5)
+      logging.info(
+          'Create index %s and default mappings for'
+          ' elasticsearch version < 5.0.0',
+          self.es_index,
       )
 
   def _FormatTimestampForElasticsearch(self, epoch_us):
@@ -889,20 +1250,30 @@ class ElasticsearchPublisher(SamplePublisher):
 
     yyyy-MM-dd HH:mm:ss.SSSSSS in string
     """
-    ts = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch_us))
-    num_dec = ('%.6f' % (epoch_us - math.floor(epoch_us))).split('.')[1]
-    new_ts = '%s.%s' % (ts, num_dec)
-    return new_ts
+    return datetime.datetime.fromtimestamp(
+        epoch_us, tz=datetime.timezone.utc
+    ).strftime('%Y-%m-%d %H:%M:%S.%f')
 
   def _deDotKeys(self, res):
-    """Recursively replace dot with underscore in all keys in a dictionary."""
-    for key, value in res.items():
-      if isinstance(value, dict):
-        self._deDotKeys(value)
-      new_key = key.replace('.', '_')
-      if new_key != key:
-        res[new_key] = res.pop(key)
-    return res
+    """Returns a copy of res with dots in all keys replaced by underscores."""
+    return {
+        key.replace('.', '_'): (
+            self._deDotKeys(value) if isinstance(value, dict) else value
+        )
+        for key, value in res.items()
+    }
+
+
+# Escapes commas and spaces in InfluxDB line protocol tag values.
+_INFLUX_TAG_ESCAPES = str.maketrans({',': '\\,', ' ': '\\ '})
+
+
+# Tag values such as the test name, owner and run URI repeat across most
+# samples, and a cache lookup is much cheaper than str.translate.
+@functools.lru_cache(maxsize=8192)
+def _EscapeInfluxTagValue(value):
+  """Escapes commas and spaces in an InfluxDB line protocol tag value."""
+  return value.translate(_INFLUX_TAG_ESCAPES)
 
 
 class InfluxDBPublisher(SamplePublisher):
@@ -913,18 +1284,60 @@ class InfluxDBPublisher(SamplePublisher):
       port.Expects the format hostname:port
     influx_db_name: Takes in tupe string. Consists of the name of Influx DB
       database that you wish to publish to or create.
+    batch: boolean. If true, buffer samples and only write them on Flush or
+      once MAX_BATCH_SIZE characters of line protocol have accumulated.
+    compress: boolean. If true, gzip-compress write request bodies.
   """
 
-  def __init__(self, influx_uri=None, influx_db_name=None):
+  PUBLISH_IN_BACKGROUND = True
+  # Sample fields written as tags, in order, ahead of the metadata tags.
+  _TAG_KEYS = (
+      'test',
+      'official',
+      'owner',
+      'run_uri',
+      'sample_uri',
+      'metric',
+      'unit',
+      'product_name',
+  )
+  # Upper bound on buffered line protocol, in characters, when batching.
+  MAX_BATCH_SIZE = 5 * 1024 * 1024
+
+  def __init__(
+      self, influx_uri=None, influx_db_name=None, batch=False, compress=False
+  ):
     super().__init__()
     # set to default above in flags unless changed
     self.influx_uri = influx_uri
     self.influx_db_name = influx_db_name
+    self.batch = batch
+    self.compress = compress
+    self._pending_samples = []
+    self._pending_size = 0
+    # Kept alive across requests and PublishSamples calls.
+    self._conn = None
+    self._db_created = False
 
   def PublishSamples(self, samples):
     formated_samples = []
     for sample in samples:
       formated_samples.append(self._ConstructSample(sample))
+    if not self.batch:
+      self._Publish(formated_samples)
+      return
+    self._pending_samples.extend(formated_samples)
+    # Each sample also takes one newline in the request body.
+    self._pending_size += sum(len(s) + 1 for s in formated_samples)
+    if self._pending_size >= self.MAX_BATCH_SIZE:
+      self.Flush()
+
+  def Flush(self):
+    if not self._pending_samples:
+      return
+    formated_samples = self._pending_samples
+    self._pending_samples = []
+    self._pending_size = 0
     self._Publish(formated_samples)
 
   def _Publish(self, formated_samples):
@@ -944,18 +1357,7 @@ class InfluxDBPublisher(SamplePublisher):
     if 'metadata' in sample:
       if sample['metadata']:
         tag_set_metadata = ','.join(self._FormatToKeyValue(sample['metadata']))
-    tag_keys = (
-        'test',
-        'official',
-        'owner',
-        'run_uri',
-        'sample_uri',
-        'metric',
-        'unit',
-        'product_name',
-    )
-    ordered_tags = collections.OrderedDict([(k, sample[k]) for k in tag_keys])
-    tag_set = ','.join(self._FormatToKeyValue(ordered_tags))
+    tag_set = ','.join(self._FormatToKeyValue(sample, self._TAG_KEYS))
     if tag_set_metadata:
       tag_set += ',' + tag_set_metadata
 
@@ -969,23 +1371,34 @@ class InfluxDBPublisher(SamplePublisher):
     )
     return sample_constructed_body
 
-  def _FormatToKeyValue(self, sample):
+  def _FormatToKeyValue(self, sample, keys=None):
+    """Formats entries of sample as escaped line protocol key=value pairs.
+
+    Args:
+      sample: dict. The entries to format.
+      keys: iterable of keys of sample to format, in order. Defaults to all of
+        them.
+
+    Returns:
+      A list of key=value strings.
+    """
     key_value_pairs = []
-    for k, v in six.iteritems(sample):
+    for k in sample if keys is None else keys:
+      v = sample[k]
       if v == '':
         v = '\\"\\"'
-      v = str(v)
-      v = v.replace(',', '\,')
-      v = v.replace(' ', '\ ')
-      key_value_pairs.append('%s=%s' % (k, v))
+      key_value_pairs.append(f'{k}={_EscapeInfluxTagValue(str(v))}')
     return key_value_pairs
 
   def _CreateDB(self):
     """Creates a database.
 
     This method is idempotent. If the DB already exists it will simply
-    return a 200 code without re-creating it.
+    return a 200 code without re-creating it. Once the DB has been created,
+    later calls return without contacting the server.
     """
+    if self._db_created:
+      return
     successful_http_request_codes = [200, 202, 204]
     header = {
         'Content-type': 'application/x-www-form-urlencoded',
@@ -994,12 +1407,10 @@ class InfluxDBPublisher(SamplePublisher):
     params = urllib.parse.urlencode(
         {'q': 'CREATE DATABASE ' + self.influx_db_name}
     )
-    conn = httplib.HTTPConnection(self.influx_uri)
-    conn.request('POST', '/query?' + params, headers=header)
-    response = conn.getresponse()
-    conn.close()
+    response = self._Request('POST', '/query?' + params, headers=header)
     if response.status in successful_http_request_codes:
       logging.debug('Success! %s DB Created', self.influx_db_name)
+      self._db_created = True
     else:
       logging.error(
           '%d Request could not be completed due to: %s',
@@ -1010,14 +1421,17 @@ class InfluxDBPublisher(SamplePublisher):
 
   def _WriteData(self, data):
     successful_http_request_codes = [200, 202, 204]
-    params = data
+    # Encoded once for the whole body. Left as a str, http.client would encode
+    # it as Latin-1, which fails on other characters in sample metadata.
+    params = data.encode('utf-8')
     header = {'Content-type': 'application/octet-stream'}
-    conn = httplib.HTTPConnection(self.influx_uri)
-    conn.request(
+    if self.compress:
+      # Line protocol is repetitive text, so it compresses well.
+      params = gzip.compress(params)
+      header['Content-Encoding'] = 'gzip'
+    response = self._Request(
         'POST', '/write?' + 'db=' + self.influx_db_name, params, headers=header
     )
-    response = conn.getresponse()
-    conn.close()
     if response.status in successful_http_request_codes:
       logging.debug('Writing samples to publisher: writing samples.')
     else:
@@ -1029,6 +1443,56 @@ class InfluxDBPublisher(SamplePublisher):
       )
       raise httplib.HTTPException
 
+  def _Request(self, method, url, body=None, headers=None):
+    """Issues a request over a connection reused between requests.
+
+    If a reused connection fails, for example because the server closed it
+    while idle, the request is retried once on a new connection.
+
+    Args:
+      method: string. The HTTP method.
+      url: string. The request path and query.
+      body: string. The request body.
+      headers: dict. The request headers.
+
+    Returns:
+      The httplib.HTTPResponse, with its body already read.
+    """
+    reused = self._conn is not None
+    if not reused:
+      self._conn = httplib.HTTPConnection(self.influx_uri)
+    try:
+      self._conn.request(method, url, body, headers=headers or {})
+      response = self._conn.getresponse()
+      # The body must be consumed before the connection can be reused.
+      response.read()
+    except (IOError, httplib.HTTPException):
+      self._conn.close()
+      self._conn = None
+      if not reused:
+        raise
+      return self._Request(method, url, body, headers)
+    return response
+
+
+def _NewSampleUris(count):
+  """Returns count random version 4 UUID strings.
+
+  Equivalent to calling str(uuid.uuid4()) count times, but reads the random
+  bytes for all of them with a single os.urandom call.
+
+  Args:
+    count: int. The number of UUIDs to generate.
+
+  Returns:
+    A list of UUID strings.
+  """
+  random_bytes = os.urandom(16 * count)
+  return [
+      str(uuid.UUID(bytes=random_bytes[i : i + 16], version=4))
+      for i in range(0, len(random_bytes), 16)
+  ]
+
 
 class SampleCollector(object):
   """A performance sample collector.
@@ -1115,13 +1579,16 @@ class SampleCollector(object):
               service_account=FLAGS.service_account,
               service_account_private_key_file=FLAGS.service_account_private_key,
               application_default_credential_file=FLAGS.application_default_credential_file,
+              batch=FLAGS.batch_publishing,
           )
       )
 
     if FLAGS.cloud_storage_bucket:
       publishers.append(
           CloudStoragePublisher(
-              FLAGS.cloud_storage_bucket, gsutil_path=FLAGS.gsutil_path
+              FLAGS.cloud_storage_bucket,
+              gsutil_path=FLAGS.gsutil_path,
+              batch=FLAGS.batch_publishing,
           )
       )
     if PARTITIONED_GCS_URL.value:
@@ -1131,6 +1598,7 @@ class SampleCollector(object):
               PARTITIONED_GCS_URL.value,
               sub_folder=now.strftime('%Y/%m/%d/%H'),
               gsutil_path=FLAGS.gsutil_path,
+              batch=FLAGS.batch_publishing,
           )
       )
     if FLAGS.csv_path:
@@ -1147,7 +1615,10 @@ class SampleCollector(object):
     if FLAGS.influx_uri:
       publishers.append(
           InfluxDBPublisher(
-              influx_uri=FLAGS.influx_uri, influx_db_name=FLAGS.influx_db_name
+              influx_uri=FLAGS.influx_uri,
+              influx_db_name=FLAGS.influx_db_name,
+              batch=FLAGS.batch_publishing,
+              compress=FLAGS.influx_gzip,
           )
       )
 
@@ -1161,21 +1632,34 @@ class SampleCollector(object):
       benchmark: string. The name of the benchmark.
       benchmark_spec: BenchmarkSpec. Benchmark specification.
     """
-    for s in samples:
-      # Annotate the sample.
-      sample: pkb_sample.SampleDict = s.asdict()
-      sample['test'] = benchmark
-
+    if not isinstance(samples, list):
+      samples = list(samples)
+    # These are the same for every sample, so look them up once.
+    product_name = FLAGS.product_name
+    official = FLAGS.official
+    owner = FLAGS.owner
+    run_uri = benchmark_spec.uuid
+    for s, sample_uri in zip(samples, _NewSampleUris(len(samples))):
+      metadata = s.metadata
       for meta_provider in self.metadata_providers:
-        sample['metadata'] = meta_provider.AddMetadata(
-            sample['metadata'], benchmark_spec
-        )
-
-      sample['product_name'] = FLAGS.product_name
-      sample['official'] = FLAGS.official
-      sample['owner'] = FLAGS.owner
-      sample['run_uri'] = benchmark_spec.uuid
-      sample['sample_uri'] = str(uuid.uuid4())
+        metadata = meta_provider.AddMetadata(metadata, benchmark_spec)
+
+      # Annotate the sample. The dict is built in one go, with the same keys
+      # in the same order as Sample.asdict() followed by the annotations,
+      # rather than growing the asdict() result one key at a time.
+      sample: pkb_sample.SampleDict = {
+          'metric': s.metric,
+          'value': s.value,
+          'unit': s.unit,
+          'metadata': metadata,
+          'timestamp': s.timestamp,
+          'test': benchmark,
+          'product_name': product_name,
+          'official': official,
+          'owner': owner,
+          'run_uri': run_uri,
+          'sample_uri': sample_uri,
+      }
       self.samples.append(sample)
 
   def PublishSamples(self):
@@ -1183,19 +1667,109 @@ class SampleCollector(object):
     if not self.samples:
       logging.warning('No samples to publish.')
       return
-    samples_for_console = []
-    for s in self.samples:
-      if not s.get(pkb_sample.DISABLE_CONSOLE_LOG, False):
-        samples_for_console.append(s)
-    for publisher in self.publishers:
-      publisher.PublishSamples(
-          self.samples
-          if publisher.PUBLISH_CONSOLE_LOG_DATA
-          else samples_for_console
-      )
+    # Only publishers that hide console-only data need the filtered list.
+    if all(p.PUBLISH_CONSOLE_LOG_DATA for p in self.publishers):
+      samples_for_console = self.samples
+    else:
+      samples_for_console = [
+          s
+          for s in self.samples
+          if not s.get(pkb_sample.DISABLE_CONSOLE_LOG, False)
+      ]
+
+    with _ShareSerializedSamples() as cache:
+
+      def _Publish(publisher):
+        with _ShareSerializedSamples(cache):
+          publisher.PublishSamples(
+              self.samples
+              if publisher.PUBLISH_CONSOLE_LOG_DATA
+              else samples_for_console
+          )
+
+      self._ForEachPublisher(_Publish)
     self.published_samples += self.samples
     self.samples = []
 
+  def Flush(self):
+    """Flushes samples buffered by publishers across PublishSamples calls."""
+    self._ForEachPublisher(lambda publisher: publisher.Flush())
+
+  def _ForEachPublisher(self, fn):
+    """Calls fn with each publisher.
+
+    When more than one publisher has PUBLISH_IN_BACKGROUND set, each of them
+    gets its own thread and the others are called in order, together on one
+    more thread, so that they overlap with the background publishers but keep
+    their relative order. Otherwise there is nothing to overlap, and all
+    publishers are called in order on the calling thread.
+
+    Args:
+      fn: function taking a SamplePublisher.
+
+    Raises:
+      Exception: the first exception raised by fn, in publisher order. It is
+        re-raised as is rather than wrapped in errors.VmUtil.ThreadException.
+    """
+    def _CallInOrder(group):
+      for publisher in group:
+        fn(publisher)
+
+    background = [p for p in self.publishers if p.PUBLISH_IN_BACKGROUND]
+    if len(background) <= 1:
+      _CallInOrder(self.publishers)
+      return
+    in_order = [p for p in self.publishers if not p.PUBLISH_IN_BACKGROUND]
+    groups = [[publisher] for publisher in background]
+    if in_order:
+      groups.insert(0, in_order)
+
+    failures = [None] * len(groups)
+
+    def _CallInOrderCapturingFailure(index, group):
+      try:
+        _CallInOrder(group)
+      except Exception as e:  # pylint: disable=broad-except
+        failures[index] = e
+
+    background_tasks.RunThreaded(
+        _CallInOrderCapturingFailure,
+        [((index, group), {}) for index, group in enumerate(groups)],
+    )
+    failures = [f for f in failures if f is not None]
+    # Only the first failure is raised, so log the ones it would hide.
+    for failure in failures[1:]:
+      logging.error('Exception while publishing.', exc_info=failure)
+    if failures:
+      raise failures[0]
+
+
+def _ReadJSONSamples(path):
+  """Yields samples read from a newline-delimited JSON file.
+
+  Each line is parsed and has its labels turned back into metadata before
+  the next one is read.
+
+  Args:
+    path: the path to the JSON file.
+
+  Yields:
+    Sample dicts.
+  """
+  with open(path, 'r') as file:
+    for line in file:
+      if not line.strip():
+        continue
+      sample = _LoadJson(line)
+      labels = sample.pop('labels')
+      # Chop '|' at the beginning and end of labels and split labels by '|,|'
+      fields = labels[1:-1].split('|,|') if labels else []
+      # str.partition splits each field without building a list for it.
+      sample['metadata'] = {
+          k: v for k, _, v in (field.partition(':') for field in fields)
+      }
+      yield sample
+
 
 def RepublishJSONSamples(path):
   """Read samples from a JSON file and re-export them.
@@ -1203,21 +1777,17 @@ def RepublishJSONSamples(path):
   Args:
     path: the path to the JSON file.
   """
-
-  with open(path, 'r') as file:
-    samples = [json.loads(s) for s in file if s]
-  for sample in samples:
-    # Chop '|' at the beginning and end of labels and split labels by '|,|'
-    fields = sample.pop('labels')[1:-1].split('|,|')
-    # Turn the fields into [[key, value], ...]
-    key_values = [field.split(':', 1) for field in fields]
-    sample['metadata'] = {k: v for k, v in key_values}
+  # Publishers take a list, and every publisher reads all of it, so the
+  # samples can't be streamed through them one at a time.
+  samples = list(_ReadJSONSamples(path))
 
   # We can't use a SampleCollector because SampleCollector.AddSamples depends on
   # having a benchmark and a benchmark_spec.
   publishers = SampleCollector._PublishersFromFlags()
-  for publisher in publishers:
-    publisher.PublishSamples(samples)
+  with _ShareSerializedSamples():
+    for publisher in publishers:
+      publisher.PublishSamples(samples)
+      publisher.Flush()
 
 
 if __name__ == '__main__':
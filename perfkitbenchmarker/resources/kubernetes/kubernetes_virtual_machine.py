@@ -205,12 +205,13 @@ class KubernetesVirtualMachine(virtual_machine.BaseVirtualMachine):
   @vm_util.Retry(poll_interval=10, max_retries=20)
   def _Exists(self) -> bool:
     """POD should have been already created but this is a double check."""
+    # Only existence matters, so avoid fetching and printing the full pod.
     exists_cmd = [
         FLAGS.kubectl,
         '--kubeconfig=%s' % FLAGS.kubeconfig,
         'get',
         'pod',
-        '-o=json',
+        '-o=name',
         self.name,
     ]
     pod_info, _, _ = vm_util.IssueCommand(exists_cmd, raise_on_failure=False)
@@ -438,6 +439,7 @@ class DebianBasedKubernetesVirtualMachine(
       ip_address: Optional[str] = None,
       should_pre_log: bool = True,
       stack_level: int = 1,
+      stdin: Optional[str] = None,
   ):
     """Runs a command in the Kubernetes container using kubectl.
 
@@ -452,6 +454,7 @@ class DebianBasedKubernetesVirtualMachine(
       should_pre_log: Whether to output a "Running command" log statement.
       stack_level: The number of stack frames to skip for an "interesting"
         callsite to be logged.
+      stdin: Optional text written to the command's standard input.
 
     Returns:
       A tuple of stdout, stderr, return_code from the command.
@@ -489,6 +492,7 @@ class DebianBasedKubernetesVirtualMachine(
           raise_on_failure=False,
           stack_level=stack_level,
           should_pre_log=False,
+          stdin=stdin,
       )
       # Check for ephemeral connection issues.
       if not _IsKubectlErrorEphemeral(retcode, stderr):
@@ -14,6 +14,7 @@
 """Functions and classes to make testing easier."""
 
 
+import collections
 import os
 
 from absl import flags
@@ -106,16 +107,47 @@ class SamplesTestMixin(object):
 
   def assertSampleInList(self, a, b, msg=None):  # pylint:disable=invalid-name
     """Assert that sample a is in list b (up to timestamp)."""
-    found = False
+    if not self._FindSampleUpToTimestamp(a, b):
+      msg = msg or f'{a} not found in {b}.'
+      raise AssertionError(msg)
+
+  def assertSamplesSubset(  # pylint:disable=invalid-name
+      self, a_list, b_list, msg=None
+  ):
+    """Assert that every sample in a_list is in b_list (up to timestamp).
+
+    Equivalent to calling assertSampleInList for each sample of a_list, but
+    b_list is indexed once by (metric, unit, value) so large lists are not
+    scanned for every sample.
+    """
+    index = collections.defaultdict(list)
+    for s in b_list:
+      index[_SampleIndexKey(s)].append(s)
+    for a in a_list:
+      # Values that round differently but are still almost equal miss the
+      # index, so fall back to a full scan before failing.
+      if not (
+          self._FindSampleUpToTimestamp(a, index.get(_SampleIndexKey(a), ()))
+          or self._FindSampleUpToTimestamp(a, b_list)
+      ):
+        msg = msg or f'{a} not found in {b_list}.'
+        raise AssertionError(msg)
+
+  def _FindSampleUpToTimestamp(self, a, b):
+    """Returns whether sample a is in iterable b (up to timestamp)."""
     for s in b:
       try:
-        self.assertSamplesEqualUpToTimestamp(a, s, msg=msg)
+        self.assertSamplesEqualUpToTimestamp(a, s)
       except self.failureException:
         continue
-      found = True
-    if not found:
-      msg = msg or f'{a} not found in {b}.'
-      raise AssertionError(msg)
+      return True
+    return False
+
+
+def _SampleIndexKey(s):
+  """Returns a hashable (metric, unit, value) key for indexing samples."""
+  value = round(s.value, 6) if isinstance(s.value, float) else s.value
+  return s.metric, s.unit, value
 
 
 def assertDiskMounts(benchmark_config, mount_point):
@@ -32,7 +32,6 @@ import typing
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 from absl import flags
-import jinja2
 from perfkitbenchmarker import background_workload
 from perfkitbenchmarker import benchmark_lookup
 from perfkitbenchmarker import data
@@ -917,17 +916,13 @@ class BaseOsMixin(six.with_metaclass(abc.ABCMeta, object)):
         'context'.
       RemoteCommandError: If there was a problem copying the file.
     """
-    with open(template_path) as fp:
-      template_contents = fp.read()
-
-    environment = jinja2.Environment(undefined=jinja2.StrictUndefined)
-    template = environment.from_string(template_contents)
+    template = vm_util.LoadJinjaTemplate(template_path)
     prefix = 'pkb-' + os.path.basename(template_path)
 
     with vm_util.NamedTemporaryFile(
         prefix=prefix, dir=vm_util.GetTempDir(), delete=False, mode='w'
     ) as tf:
-      tf.write(template.render(vm=self, **context))
+      template.stream(vm=self, **context).dump(tf)
       tf.close()
       self.RemoteCopy(tf.name, remote_path)
 
@@ -17,21 +17,24 @@
 
 import contextlib
 import enum
+import functools
 import logging
 import os
 import platform
 import posixpath
 import random
 import re
+import secrets
+import shutil
 import string
 import subprocess
 import tempfile
-import threading
 import time
 from typing import Callable, Dict, Iterable, Optional, Tuple
 
 from absl import flags
 import jinja2
+from perfkitbenchmarker import background_tasks
 from perfkitbenchmarker import data
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import temp_dir
@@ -62,6 +65,13 @@ WINDOWS = 'nt'
 DARWIN = 'Darwin'
 PASSWORD_LENGTH = 15
 
+# The host OS and /usr/bin/time do not change during a run, so look them up
+# once rather than on every IssueCommand.
+_RUNNING_ON_WINDOWS = os.name == WINDOWS
+_RUNNING_ON_DARWIN = not _RUNNING_ON_WINDOWS and platform.system() == DARWIN
+_TIME_FILE_PATH = '/usr/bin/time'
+_TIME_FILE_EXISTS = os.path.isfile(_TIME_FILE_PATH)
+
 OUTPUT_STDOUT = 0
 OUTPUT_STDERR = 1
 OUTPUT_EXIT_CODE = 2
@@ -254,38 +264,114 @@ def GetPublicKeyPath():
 
 def GetSshOptions(ssh_key_filename, connect_timeout=None):
   """Return common set of SSH and SCP options."""
+  control_path = None
+  if FLAGS.ssh_reuse_connections:
+    control_path = FLAGS.ssh_control_path or os.path.join(
+        temp_dir.GetSshConnectionsDir(), '%h'
+    )
+  return list(
+      _BuildSshOptions(
+          ssh_key_filename,
+          connect_timeout or FLAGS.ssh_connect_timeout,
+          FLAGS.ssh_server_alive_interval,
+          FLAGS.ssh_server_alive_count_max,
+          FLAGS.use_ipv6,
+          control_path,
+          FLAGS.ssh_control_persist,
+          tuple(FLAGS.ssh_options),
+      )
+  )
+
+
+@functools.lru_cache(maxsize=64)
+def _BuildSshOptions(
+    ssh_key_filename,
+    connect_timeout,
+    server_alive_interval,
+    server_alive_count_max,
+    use_ipv6,
+    control_path,
+    control_persist,
+    ssh_options,
+):
+  """Returns GetSshOptions' options as a tuple.
+
+  The options only change with their arguments, which are fixed for a run
+  apart from the key file and timeout, so they are built once and reused for
+  every remote command.
+
+  Args:
+    ssh_key_filename: The private key file to authenticate with.
+    connect_timeout: Value for ssh -o ConnectTimeout.
+    server_alive_interval: Value for ssh -o ServerAliveInterval.
+    server_alive_count_max: Value for ssh -o ServerAliveCountMax.
+    use_ipv6: Whether to force IPv6.
+    control_path: The ControlPath to reuse connections through, or None to not
+      reuse connections.
+    control_persist: Value for ssh -o ControlPersist.
+    ssh_options: A tuple of additional options to append.
+  """
   # pyformat: disable
-  options = [
+  options = (
       '-2',
       '-o', 'UserKnownHostsFile=/dev/null',
       '-o', 'StrictHostKeyChecking=no',
       '-o', 'IdentitiesOnly=yes',
       '-o', 'PreferredAuthentications=publickey',
       '-o', 'PasswordAuthentication=no',
-      '-o', f'ConnectTimeout={connect_timeout or FLAGS.ssh_connect_timeout}',
+      '-o', f'ConnectTimeout={connect_timeout}',
       '-o', 'GSSAPIAuthentication=no',
-      '-o', f'ServerAliveInterval={FLAGS.ssh_server_alive_interval}',
-      '-o', f'ServerAliveCountMax={FLAGS.ssh_server_alive_count_max}',
+      '-o', f'ServerAliveInterval={server_alive_interval}',
+      '-o', f'ServerAliveCountMax={server_alive_count_max}',
       '-i', ssh_key_filename,
-  ]
+  )
   # pyformat: enable
-  if FLAGS.use_ipv6:
-    options.append('-6')
-  if FLAGS.ssh_reuse_connections:
-    control_path = FLAGS.ssh_control_path or os.path.join(
-        temp_dir.GetSshConnectionsDir(), '%h'
-    )
-    options.extend([
+  if use_ipv6:
+    options += ('-6',)
+  if control_path is not None:
+    options += (
         '-o',
         'ControlPath="%s"' % control_path,
         '-o',
         'ControlMaster=auto',
         '-o',
-        'ControlPersist=%s' % FLAGS.ssh_control_persist,
-    ])
-  options.extend(FLAGS.ssh_options)
+        'ControlPersist=%s' % control_persist,
+    )
+  return options + ssh_options
+
 
-  return options
+def ShutdownSshMasters(vms):
+  """Closes the shared SSH connections kept open by --ssh_reuse_connections.
+
+  With ControlPersist, the master ssh process for each VM otherwise outlives
+  PKB until the connection to the deleted VM times out.
+
+  Args:
+    vms: The VMs to close connections to. VMs that are not reached over SSH
+      are skipped.
+  """
+  if not FLAGS.ssh_reuse_connections:
+    return
+
+  def _ShutdownSshMaster(vm):
+    if not vm.ip_address:
+      return
+    ssh_private_key = (
+        vm.ssh_private_key if vm.is_static else GetPrivateKeyPath()
+    )
+    IssueCommand(
+        ['ssh', '-O', 'exit', '-p', str(vm.ssh_port)]
+        + GetSshOptions(ssh_private_key)
+        + ['%s@%s' % (vm.user_name, vm.GetConnectionIp())],
+        timeout=FLAGS.ssh_connect_timeout,
+        raise_on_failure=False,
+        raise_on_timeout=False,
+        should_pre_log=False,
+    )
+
+  ssh_vms = [vm for vm in vms if hasattr(vm, 'ssh_port')]
+  if ssh_vms:
+    background_tasks.RunThreaded(_ShutdownSshMaster, ssh_vms)
 
 
 def Retry(
@@ -295,12 +381,16 @@ def Retry(
     fuzz=FUZZ,
     log_errors=True,
     retryable_exceptions=None,
+    max_backoff_exp=0,
+    backoff_cap=None,
+    backoff_policy=None,
 ):
   """A function decorator that will retry when exceptions are thrown.
 
   Args:
     poll_interval: The time between tries in seconds. This is the maximum poll
-      interval when fuzz is specified.
+      interval when fuzz is specified. With max_backoff_exp, this is the
+      interval after the first failure.
     max_retries: The maximum number of retries before giving up. If -1, this
       means continue until the timeout is reached. The function will stop
       retrying when either max_retries is met or timeout is reached.
@@ -315,6 +405,14 @@ def Retry(
     retryable_exceptions: A tuple of exceptions that should be retried. By
       default, this is None, which indicates that all exceptions should be
       retried.
+    max_backoff_exp: The interval doubles after each failed try, up to
+      poll_interval * 2**max_backoff_exp. At 0 (the default), every try waits
+      poll_interval. Combined with fuzz, this gives capped exponential backoff
+      with jitter, which keeps many concurrent retriers from synchronizing.
+    backoff_cap: If set, the maximum interval in seconds between tries.
+    backoff_policy: An optional function that is passed each retried exception
+      and returns a (poll_interval, max_backoff_exp) tuple to use for it instead
+      of the arguments above, or None to use them.
 
   Returns:
     A function that wraps functions in retry logic. It can be
@@ -348,8 +446,14 @@ def Retry(
           tries += 1
           return f(*args, **kwargs)
         except retryable_exceptions as e:
+          interval, backoff_exp = poll_interval, max_backoff_exp
+          if backoff_policy:
+            interval, backoff_exp = backoff_policy(e) or (interval, backoff_exp)
+          interval *= 2 ** min(tries - 1, backoff_exp)
+          if backoff_cap is not None:
+            interval = min(interval, backoff_cap)
           fuzz_multiplier = 1 - fuzz + random.random() * fuzz
-          sleep_time = poll_interval * fuzz_multiplier
+          sleep_time = interval * fuzz_multiplier
           if (time.time() + sleep_time) >= deadline:
             raise TimeoutExceededRetryError() from e
           elif max_retries >= 0 and tries > max_retries:
@@ -364,23 +468,12 @@ def Retry(
   return Wrap
 
 
-class _BoxedObject(object):
-  """Box a value in a reference so it is modifiable inside an inner function.
-
-  In python3 the nonlocal keyword could be used instead - but for python2
-  there is no support for modifying an external scoped variable value.
-  """
-
-  def __init__(self, initial_value):
-    self.value = initial_value
-
-
 def _ReadIssueCommandOutput(tf_out, tf_err):
   """Reads IssueCommand Output from stdout and stderr."""
   tf_out.seek(0)
-  stdout = tf_out.read().decode('ascii', 'ignore')
+  stdout = tf_out.read().decode('utf-8', 'replace')
   tf_err.seek(0)
-  stderr = tf_err.read().decode('ascii', 'ignore')
+  stderr = tf_err.read().decode('utf-8', 'replace')
   return stdout, stderr
 
 
@@ -395,6 +488,7 @@ def IssueCommand(
     suppress_logging: bool = False,
     raise_on_timeout: bool = True,
     stack_level: int = 1,
+    stdin: Optional[str] = None,
 ) -> Tuple[str, str, int]:
   """Tries running the provided command once.
 
@@ -423,6 +517,8 @@ def IssueCommand(
       timeout being hit should raise a IssueCommandTimeoutError
     stack_level: Number of stack frames to skip & get an "interesting" caller,
       for logging. 1 skips this function, 2 skips this & its caller, etc..
+    stdin: Optional string written to the command's standard input, which is
+      then closed.
 
   Returns:
     A tuple of stdout, stderr, and retcode from running the provided command.
@@ -443,7 +539,7 @@ def IssueCommand(
     raise ValueError(
         f'Command must be a list of strings, but string {cmd} was received'
     )
-  full_cmd = ' '.join(str(w) for w in cmd)
+  full_cmd = ' '.join(map(str, cmd))
   if '; ' in full_cmd:
     logger.warning(
         (
@@ -454,25 +550,28 @@ def IssueCommand(
         full_cmd,
     )
 
-  time_file_path = '/usr/bin/time'
-
-  running_on_windows = RunningOnWindows()
-  running_on_darwin = RunningOnDarwin()
   should_time = (
-      not (running_on_windows or running_on_darwin)
-      and os.path.isfile(time_file_path)
+      not (_RUNNING_ON_WINDOWS or _RUNNING_ON_DARWIN)
+      and _TIME_FILE_EXISTS
       and FLAGS.time_commands
   )
-  shell_value = running_on_windows
+  shell_value = _RUNNING_ON_WINDOWS
+  # Output goes to files rather than pipes: with --ssh_reuse_connections the
+  # backgrounded ssh master inherits stdout/stderr, so reading pipes to EOF
+  # would block until the master exits.
   with (
       tempfile.TemporaryFile() as tf_out,
       tempfile.TemporaryFile() as tf_err,
-      tempfile.NamedTemporaryFile(mode='r') as tf_timing,
+      (
+          tempfile.NamedTemporaryFile(mode='r')
+          if should_time
+          else contextlib.nullcontext()
+      ) as tf_timing,
   ):
     cmd_to_use = cmd
     if should_time:
       cmd_to_use = [
-          time_file_path,
+          _TIME_FILE_PATH,
           '-o',
           tf_timing.name,
           '--quiet',
@@ -502,11 +601,14 @@ def IssueCommand(
         ) from e
       raise
 
-    did_timeout = _BoxedObject(False)
-    was_killed = _BoxedObject(False)
-
-    def _KillProcess():
-      did_timeout.value = True
+    did_timeout = False
+    try:
+      if stdin is None:
+        process.wait(timeout=timeout)
+      else:
+        process.communicate(stdin.encode('utf-8'), timeout=timeout)
+    except subprocess.TimeoutExpired:
+      did_timeout = True
       if not raise_on_timeout:
         logger.warning(
             'IssueCommand timed out after %d seconds. Killing command "%s".',
@@ -515,15 +617,7 @@ def IssueCommand(
             stacklevel=stack_level,
         )
       process.kill()
-      was_killed.value = True
-
-    timer = threading.Timer(timeout, _KillProcess)
-    timer.start()
-
-    try:
       process.wait()
-    finally:
-      timer.cancel()
 
     stdout, stderr = _ReadIssueCommandOutput(tf_out, tf_err)
 
@@ -531,6 +625,14 @@ def IssueCommand(
     if should_time:
       timing_output = tf_timing.read().rstrip('\n')
 
+  if (
+      _VM_COMMAND_LOG_MODE.value == VmCommandLogMode.LOG_ON_ERROR
+      and not process.returncode
+      and not did_timeout
+  ):
+    # Nothing will be logged or raised, so skip formatting the output.
+    return stdout, stderr, process.returncode
+
   logged_stdout = '[REDACTED]' if suppress_logging else stdout
   logged_stderr = '[REDACTED]' if suppress_logging else stderr
   debug_text = 'Ran: {%s}\nReturnCode:%s%s\nSTDOUT: %s\nSTDERR: %s' % (
@@ -549,16 +651,10 @@ def IssueCommand(
   # Raise timeout error regardless of raise_on_failure - as the intended
   # semantics is to ignore expected errors caused by invoking the command
   # not errors from PKB infrastructure.
-  if did_timeout.value and raise_on_timeout:
+  if did_timeout and raise_on_timeout:
     debug_text = (
         '{0}\nIssueCommand timed out after {1} seconds.  '
-        '{2} by perfkitbenchmarker.'.format(
-            debug_text,
-            timeout,
-            'Process was killed'
-            if was_killed.value
-            else 'Process may have been killed',
-        )
+        'Process was killed by perfkitbenchmarker.'.format(debug_text, timeout)
     )
     raise errors.VmUtil.IssueCommandTimeoutError(debug_text)
   elif process.returncode and (raise_on_failure or suppress_failure):
@@ -601,7 +697,42 @@ def IssueBackgroundCommand(cmd, stdout_path, stderr_path, env=None):
   )
 
 
-@Retry()
+# (binary, stderr pattern, poll_interval, max_backoff_exp) for errors that
+# IssueRetryableCommand should not retry at the default fixed interval.
+# Throttling clears quickly once callers spread out, so start short and back
+# off rather than having every thread retry together every POLL_INTERVAL.
+_RETRYABLE_COMMAND_BACKOFF = (
+    (
+        'gcloud',
+        re.compile(r'RESOURCE_EXHAUSTED|rateLimitExceeded|Rate Limit Exceeded'),
+        5,
+        3,
+    ),
+    (
+        'aws',
+        re.compile(r'Throttling|RequestLimitExceeded|TooManyRequests'),
+        5,
+        3,
+    ),
+    ('az', re.compile(r'TooManyRequests|RetryableError'), 5, 3),
+)
+
+
+def _RetryableCommandBackoff(e):
+  """Returns IssueRetryableCommand's (poll_interval, max_backoff_exp) for e."""
+  if not isinstance(e, errors.VmUtil.CalledProcessException) or not e.cmd:
+    return None
+  binary = os.path.basename(str(e.cmd[0]))
+  stderr = e.stderr or ''
+  for policy_binary, pattern, poll_interval, max_backoff_exp in (
+      _RETRYABLE_COMMAND_BACKOFF
+  ):
+    if binary == policy_binary and pattern.search(stderr):
+      return poll_interval, max_backoff_exp
+  return None
+
+
+@Retry(backoff_policy=_RetryableCommandBackoff)
 def IssueRetryableCommand(cmd, env=None, **kwargs):
   """Tries running the provided command until it succeeds or times out.
 
@@ -627,11 +758,16 @@ def IssueRetryableCommand(cmd, env=None, **kwargs):
         stderr,
     )
     raise errors.VmUtil.CalledProcessException(
-        'Command returned a non-zero exit code:\n{}'.format(debug_text)
+        'Command returned a non-zero exit code:\n{}'.format(debug_text),
+        cmd=cmd,
+        stderr=stderr,
     )
   return stdout, stderr
 
 
+_TIME_COMMAND_REAL_RE = re.compile(r'real\s+(\d+)m(\d+\.\d+)')
+
+
 def ParseTimeCommandResult(command_result):
   """Parse command result and get time elapsed.
 
@@ -645,9 +781,8 @@ def ParseTimeCommandResult(command_result):
   Returns:
      Time taken for the command.
   """
-  time_data = re.findall(r'real\s+(\d+)m(\d+.\d+)', command_result)
-  time_in_seconds = 60 * float(time_data[0][0]) + float(time_data[0][1])
-  return time_in_seconds
+  match = _TIME_COMMAND_REAL_RE.search(command_result)
+  return 60 * float(match.group(1)) + float(match.group(2))
 
 
 def ShouldRunOnExternalIpAddress(ip_type=None):
@@ -691,19 +826,43 @@ def ShouldRunOnInternalIpAddress(sending_vm, receiving_vm, ip_type=None):
 def GetLastRunUri():
   """Returns the last run_uri used (or None if it can't be determined)."""
   runs_dir_path = temp_dir.GetAllRunsDirPath()
+  # scandir entries cache their stat results, so each run directory is only
+  # stat'ed once.
+  last_run_uri, last_mtime = None, None
   try:
-    dir_names = next(os.walk(runs_dir_path))[1]
-  except StopIteration:
+    entries = os.scandir(runs_dir_path)
+  except OSError:
     # The runs directory was not found.
     return None
+  with entries:
+    for entry in entries:
+      try:
+        if not entry.is_dir():
+          continue
+        mtime = entry.stat().st_mtime
+      except OSError:
+        # The entry was removed after the directory was listed.
+        continue
+      if last_mtime is None or mtime > last_mtime:
+        last_run_uri, last_mtime = entry.name, mtime
+
+  # The subdirectory with the most recent modification time, or None if no run
+  # subdirectories were found in the runs directory.
+  return last_run_uri
 
-  if not dir_names:
-    # No run subdirectories were found in the runs directory.
-    return None
 
-  # Return the subdirectory with the most recent modification time.
-  return max(
-      dir_names, key=lambda d: os.path.getmtime(os.path.join(runs_dir_path, d))
+def TempPath(prefix='pkb', suffix=''):
+  """Returns a unique path in the local temp directory without creating it.
+
+  Use this instead of NamedTemporaryFile when only a name is needed, e.g. as
+  the destination of a download.
+
+  Args:
+    prefix: The start of the file name.
+    suffix: The end of the file name.
+  """
+  return os.path.join(
+      tempfile.gettempdir(), f'{prefix}-{secrets.token_hex(12)}{suffix}'
   )
 
 
@@ -742,6 +901,38 @@ def NamedTemporaryFile(
       os.unlink(f.name)
 
 
+def _LoadJinjaSource(template_path):
+  """Jinja2 FunctionLoader callback that reads a template from its path."""
+  mtime = os.path.getmtime(template_path)
+  with open(template_path) as fp:
+    source = fp.read()
+  return (
+      source,
+      template_path,
+      lambda: os.path.getmtime(template_path) == mtime,
+  )
+
+
+# Shared so that each template file is parsed and compiled once per run and
+# reloaded only if it changes on disk.
+_JINJA_ENVIRONMENT = jinja2.Environment(
+    undefined=jinja2.StrictUndefined,
+    loader=jinja2.FunctionLoader(_LoadJinjaSource),
+)
+
+
+def LoadJinjaTemplate(template_path: str) -> jinja2.Template:
+  """Returns the compiled Jinja2 template at template_path.
+
+  Templates use StrictUndefined, so rendering raises jinja2.UndefinedError if a
+  variable is missing from the context.
+
+  Args:
+    template_path: Local path to a Jinja2 template.
+  """
+  return _JINJA_ENVIRONMENT.get_template(os.path.abspath(template_path))
+
+
 def GenerateSSHConfig(vms, vm_groups):
   """Generates an SSH config file to simplify connecting to the specified VMs.
 
@@ -757,12 +948,9 @@ def GenerateSSHConfig(vms, vm_groups):
     vm_groups: dict mapping VM group name string to list of BaseVirtualMachines.
   """
   target_file = os.path.join(GetTempDir(), 'ssh_config')
-  template_path = data.ResourcePath('ssh_config.j2')
-  environment = jinja2.Environment(undefined=jinja2.StrictUndefined)
-  with open(template_path) as fp:
-    template = environment.from_string(fp.read())
+  template = LoadJinjaTemplate(data.ResourcePath('ssh_config.j2'))
   with open(target_file, 'w') as ofp:
-    ofp.write(template.render({'vms': vms, 'vm_groups': vm_groups}))
+    template.stream({'vms': vms, 'vm_groups': vm_groups}).dump(ofp)
 
   ssh_options = [
       '  ssh -F {0} {1}'.format(target_file, pattern)
@@ -775,28 +963,19 @@ def GenerateSSHConfig(vms, vm_groups):
 
 def RunningOnWindows():
   """Returns True if PKB is running on Windows."""
-  return os.name == WINDOWS
+  return _RUNNING_ON_WINDOWS
 
 
 def RunningOnDarwin():
   """Returns True if PKB is running on a Darwin OS machine."""
-  return os.name != WINDOWS and platform.system() == DARWIN
+  return _RUNNING_ON_DARWIN
 
 
 def ExecutableOnPath(executable_name):
   """Return True if the given executable can be found on the path."""
-  cmd = ['where'] if RunningOnWindows() else ['which']
-  cmd.append(executable_name)
-
-  shell_value = RunningOnWindows()
-  process = subprocess.Popen(
-      cmd, shell=shell_value, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-  )
-  process.communicate()
-
-  if process.returncode:
-    return False
-  return True
+  # Searches PATH (and PATHEXT on Windows) in-process like which/where,
+  # without spawning a subprocess for each lookup.
+  return shutil.which(executable_name) is not None
 
 
 def GenerateRandomWindowsPassword(
@@ -810,29 +989,31 @@ def GenerateRandomWindowsPassword(
   # Ensure that the password contains at least one of each 4 required
   # character types starting with letters to avoid starting with chars which
   # are problematic on the command line e.g. @.
+  # Use secrets rather than random since this is a credential.
   prefix = [
-      random.choice(string.ascii_lowercase),
-      random.choice(string.ascii_uppercase),
-      random.choice(string.digits),
-      random.choice(special_chars),
-  ]
-  password = [
-      random.choice(string.ascii_letters + string.digits + special_chars)
-      for _ in range(password_length - 4)
+      secrets.choice(string.ascii_lowercase),
+      secrets.choice(string.ascii_uppercase),
+      secrets.choice(string.digits),
+      secrets.choice(special_chars),
   ]
+  chars = string.ascii_letters + string.digits + special_chars
+  password = [secrets.choice(chars) for _ in range(password_length - 4)]
   return ''.join(prefix + password)
 
 
 def CopyFileBetweenVms(filename, src_vm, src_path, dest_vm, dest_path):
   """Copies a file from the src_vm to the dest_vm."""
-  with tempfile.NamedTemporaryFile() as tf:
-    temp_path = tf.name
+  temp_path = TempPath()
+  try:
     src_vm.RemoteCopy(
         temp_path, os.path.join(src_path, filename), copy_to=False
     )
     dest_vm.RemoteCopy(
         temp_path, os.path.join(dest_path, filename), copy_to=True
     )
+  finally:
+    with contextlib.suppress(FileNotFoundError):
+      os.unlink(temp_path)
 
 
 def ReplaceText(vm, current_value, new_value, file_name, regex_char='/'):
@@ -865,16 +1046,16 @@ def DictionaryToEnvString(dictionary, joiner=' '):
 
 def CreateRemoteFile(vm, file_contents, file_path):
   """Creates a file on the remote server."""
-  with NamedTemporaryFile(mode='w') as tf:
-    tf.write(file_contents)
-    tf.close()
-    parent_dir = posixpath.dirname(file_path)
-    vm.RemoteCommand(f'[ -d {parent_dir} ] || mkdir -p {parent_dir}')
-    vm.PushFile(tf.name, file_path)
+  parent_dir = posixpath.dirname(file_path)
+  # The contents go over the command's stdin so that they aren't logged.
+  vm.RemoteCommand(
+      f'[ -d {parent_dir} ] || mkdir -p {parent_dir} && cat > {file_path}',
+      stdin=file_contents,
+  )
 
 
 def ReadLocalFile(filename: str) -> str:
   """Read the local file."""
   file_path = posixpath.join(GetTempDir(), filename)
-  stdout, _, _ = IssueCommand(['cat', file_path])
-  return stdout
+  with open(file_path, encoding='utf-8', errors='replace') as f:
+    return f.read()
@@ -363,6 +363,7 @@ class TestRemoteCommand(pkb_common_test_case.PkbCommonTestCase):
         should_pre_log=False,
         raise_on_failure=False,
         stack_level=mock.ANY,
+        stdin=None,
     )
 
   def testIssueCommanndCalledWithStackLevel(self):
@@ -373,6 +374,7 @@ class TestRemoteCommand(pkb_common_test_case.PkbCommonTestCase):
         should_pre_log=False,
         raise_on_failure=False,
         stack_level=4,
+        stdin=None,
     )
 
   @parameterized.parameters(
@@ -396,6 +398,18 @@ class TestRemoteCommand(pkb_common_test_case.PkbCommonTestCase):
         should_pre_log=False,
         raise_on_failure=False,
         stack_level=mock.ANY,
+        stdin=None,
+    )
+
+  def testStdinPassedToSsh(self):
+    self.vm.RemoteCommand('cat > f', stdin='contents')
+    self.issue_cmd_mock.assert_called_once_with(
+        matchers.HASALLOF('ssh', 'cat > f'),
+        timeout=None,
+        should_pre_log=False,
+        raise_on_failure=False,
+        stack_level=mock.ANY,
+        stdin='contents',
     )
 
   def testNonZeroReturnCodeRaises(self):
@@ -32,6 +32,7 @@ from perfkitbenchmarker import publisher
 from perfkitbenchmarker import sample
 from perfkitbenchmarker import stages
 from perfkitbenchmarker import test_util
+from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.providers.gcp import util as gcp_utils
 from tests import pkb_common_test_case
 
@@ -697,6 +698,52 @@ class TestRunBenchmarks(pkb_common_test_case.PkbCommonTestCase):
     self.assertEmpty(test_retry_manager._zones_tried)
 
 
+class BatchPublishingTest(pkb_common_test_case.PkbCommonTestCase):
+
+  @flagsaver.flagsaver(
+      batch_publishing=True,
+      bigquery_table='dataset.table',
+      create_failed_run_samples=True,
+      json_path='',
+  )
+  def testFailedRunSampleIsUploaded(self):
+    self.enter_context(
+        mock.patch.object(pkb, 'DoProvisionPhase', side_effect=Exception())
+    )
+    test_spec = pkb_common_test_case.CreateBenchmarkSpecFromYaml(
+        pkb_common_test_case.SIMPLE_CONFIG, 'cluster_boot'
+    )
+    self.enter_context(mock.patch.object(test_spec, 'Pickle'))
+    self.enter_context(
+        mock.patch.object(
+            vm_util, 'GetTempDir', return_value=self.create_tempdir().full_path
+        )
+    )
+    mock_load = self.enter_context(
+        mock.patch.object(publisher.BigQueryPublisher, '_Load')
+    )
+    collector = publisher.SampleCollector()
+
+    with self.assertRaises(Exception):
+      pkb.RunBenchmark(test_spec, collector)
+
+    mock_load.assert_called_once_with(mock.ANY, 1)
+
+
+class DoTeardownPhaseTest(pkb_common_test_case.PkbCommonTestCase):
+
+  def testSshMasterShutdownFailureStillDeletes(self):
+    self.enter_context(
+        mock.patch.object(
+            vm_util, 'ShutdownSshMasters', side_effect=errors.Error()
+        )
+    )
+    spec = mock.Mock(vms=[])
+    with self.assertLogs(level='ERROR'):
+      pkb.DoTeardownPhase(spec, mock.Mock(), mock.MagicMock())
+    spec.Delete.assert_called_once()
+
+
 class FreezeRestoreTest(pkb_common_test_case.PkbCommonTestCase):
 
   @flagsaver.flagsaver(freeze='mock_freeze_path')
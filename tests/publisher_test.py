@@ -15,14 +15,19 @@
 
 import collections
 import csv
+import gzip
 import json
+import math
+import os
 import re
+import sys
 import tempfile
 import unittest
 import uuid
 from absl import flags
 import mock
 
+from perfkitbenchmarker import errors
 from perfkitbenchmarker import pkb  # pylint: disable=unused-import
 from perfkitbenchmarker import publisher
 from perfkitbenchmarker import sample
@@ -134,6 +139,117 @@ class NewlineDelimitedJSONPublisherTestCase(unittest.TestCase):
         result,
     )
 
+  def testSamplesNotModified(self):
+    samples = [{'test': 'testa', 'metadata': {'key': 'val'}}]
+    self.instance.PublishSamples(samples)
+    publisher.NewlineDelimitedJSONPublisher(
+        self.fp.name, mode='a', collapse_labels=False
+    ).PublishSamples(samples)
+    self.assertListEqual(
+        [
+            {'test': 'testa', 'labels': '|key:val|'},
+            {'test': 'testa', 'metadata': {'key': 'val'}},
+        ],
+        [json.loads(i) for i in self.fp],
+    )
+    self.assertListEqual(
+        [{'test': 'testa', 'metadata': {'key': 'val'}}], samples
+    )
+
+  def testLoadJsonAcceptsNaN(self):
+    self.assertTrue(math.isnan(publisher._LoadJson('{"value": NaN}')['value']))
+
+  def testReadJSONSamples(self):
+    samples = [
+        {'test': 'testa', 'metadata': {'key': 'val'}},
+        {'test': 'testb', 'metadata': {'key2': 'val:2', 'key3': 'val3'}},
+        {'test': 'testc', 'metadata': {}},
+    ]
+    self.instance.PublishSamples(samples)
+    with open(self.fp.name, 'a') as f:
+      f.write('\n')
+    self.assertListEqual(
+        samples, list(publisher._ReadJSONSamples(self.fp.name))
+    )
+
+  def testLocksOnlyWhenAppending(self):
+    samples = [{'test': 'testa', 'metadata': {}}]
+    with mock.patch.object(publisher.fcntl, 'flock') as mock_flock:
+      self.instance.PublishSamples(samples)
+      mock_flock.assert_not_called()
+      publisher.NewlineDelimitedJSONPublisher(
+          self.fp.name, mode='a'
+      ).PublishSamples(samples)
+      mock_flock.assert_called_once_with(mock.ANY, publisher.fcntl.LOCK_EX)
+    self.assertEqual(2, len(self.fp.readlines()))
+
+  def testCompactSeparators(self):
+    samples = [{'test': 'testa', 'value': 1.5, 'metadata': {'key': 'v\u00e9'}}]
+    expected = '{"test":"testa","value":1.5,"labels":"|key:v\u00e9|"}\n'
+    self.assertEqual(
+        expected, publisher._SamplesToNewlineDelimitedJSON(samples, True)
+    )
+    with mock.patch.object(publisher, 'orjson', None):
+      self.assertEqual(
+          expected, publisher._SamplesToNewlineDelimitedJSON(samples, True)
+      )
+
+  def testNonFiniteValuesMatchWithoutOrjson(self):
+    samples = [
+        {'test': 'testa', 'value': float('nan'), 'metadata': {'key': None}},
+        {'test': 'testb', 'value': 1.0, 'metadata': {'inf': float('inf')}},
+    ]
+    with_orjson = publisher._SamplesToNewlineDelimitedJSON(samples, False)
+    with mock.patch.object(publisher, 'orjson', None):
+      without_orjson = publisher._SamplesToNewlineDelimitedJSON(samples, False)
+    self.assertEqual(without_orjson, with_orjson)
+    self.assertIn('NaN', with_orjson)
+    self.assertIn('Infinity', with_orjson)
+    first, second = with_orjson.splitlines()
+    self.assertTrue(math.isnan(publisher._LoadJson(first)['value']))
+    self.assertIsNone(publisher._LoadJson(first)['metadata']['key'])
+    self.assertEqual(
+        float('inf'), publisher._LoadJson(second)['metadata']['inf']
+    )
+
+  def testSharedSerializationIsPerList(self):
+    with publisher._ShareSerializedSamples():
+      for value in range(10):
+        # Each list is freed after its call, so its id may be reused.
+        serialized = publisher._SamplesToNewlineDelimitedJSON(
+            [{'test': 'testa', 'value': value, 'metadata': {}}], False
+        )
+        self.assertIn('"value":%d,' % value, serialized)
+
+  def testExponentFloatsDifferOnlyInSpelling(self):
+    samples = [{'test': 'testa', 'value': 1e16, 'metadata': {'small': 1e-7}}]
+    with_orjson = publisher._SamplesToNewlineDelimitedJSON(samples, False)
+    with mock.patch.object(publisher, 'orjson', None):
+      without_orjson = publisher._SamplesToNewlineDelimitedJSON(samples, False)
+    self.assertEqual(
+        '{"test":"testa","value":1e16,"metadata":{"small":1e-7}}\n',
+        with_orjson,
+    )
+    self.assertEqual(
+        '{"test":"testa","value":1e+16,"metadata":{"small":1e-07}}\n',
+        without_orjson,
+    )
+    self.assertEqual(json.loads(with_orjson), json.loads(without_orjson))
+
+  @mock.patch.object(publisher, 'orjson', None)
+  def testJSONRecordPerLineWithoutOrjson(self):
+    self.testJSONRecordPerLine()
+
+  def testUnsupportedTypeFallsBackToJson(self):
+    samples = [{'test': 'testa', 'value': 1.5, 'metadata': {'key': 'val'}}]
+    with mock.patch.object(publisher, 'orjson') as mock_orjson:
+      mock_orjson.dumps.side_effect = TypeError
+      self.instance.PublishSamples(samples)
+    self.assertDictEqual(
+        {'test': 'testa', 'value': 1.5, 'labels': '|key:val|'},
+        json.load(self.fp),
+    )
+
 
 class BigQueryPublisherTestCase(unittest.TestCase):
 
@@ -209,6 +325,34 @@ class BigQueryPublisherTestCase(unittest.TestCase):
     instance.PublishSamples(self.samples)  # No error
     self.mock_vm_util.IssueRetryableCommand.assert_called_once_with(mock.ANY)
 
+  def testBatchLoadsOnFlush(self):
+    instance = publisher.BigQueryPublisher(self.table, batch=True)
+    instance.PublishSamples(self.samples)
+    instance.PublishSamples(self.samples)
+    self.mock_vm_util.IssueRetryableCommand.assert_not_called()
+
+    def _CheckStagedSamples(load_cmd):
+      with open(load_cmd[-1]) as f:
+        self.assertEqual(4, len(f.readlines()))
+
+    self.mock_vm_util.IssueRetryableCommand.side_effect = _CheckStagedSamples
+    instance.Flush()
+    self.mock_vm_util.IssueRetryableCommand.assert_called_once_with([
+        'bq',
+        'load',
+        '--autodetect',
+        '--source_format=NEWLINE_DELIMITED_JSON',
+        self.table,
+        mock.ANY,
+    ])
+    staged_path = self.mock_vm_util.IssueRetryableCommand.call_args[0][0][-1]
+    self.assertFalse(os.path.exists(staged_path))
+
+  def testBatchFlushWithoutSamples(self):
+    instance = publisher.BigQueryPublisher(self.table, batch=True)
+    instance.Flush()
+    self.mock_vm_util.IssueRetryableCommand.assert_not_called()
+
 
 class CloudStoragePublisherTestCase(unittest.TestCase):
 
@@ -291,6 +435,126 @@ class SampleCollectorTestCase(unittest.TestCase):
     self.instance.AddSamples(samples, self.benchmark, self.benchmark_spec)
     self.assertDictContainsSubset({'timestamp': 1.0}, self.instance.samples[0])
 
+  def testSampleUris(self):
+    self.instance.AddSamples(
+        [self.sample, self.sample], self.benchmark, self.benchmark_spec
+    )
+    sample_uris = [s['sample_uri'] for s in self.instance.samples]
+    self.assertNotEqual(sample_uris[0], sample_uris[1])
+    for sample_uri in sample_uris:
+      self.assertEqual(4, uuid.UUID(sample_uri).version)
+      self.assertEqual(sample_uri, str(uuid.UUID(sample_uri)))
+
+  def testPublishSamplesSerializesJSONOnce(self):
+    files = []
+    for _ in range(2):
+      f = tempfile.NamedTemporaryFile(mode='w+', suffix='.json')
+      self.addCleanup(f.close)
+      files.append(f)
+    self.instance.publishers = [
+        publisher.NewlineDelimitedJSONPublisher(f.name) for f in files
+    ]
+    self.instance.samples = [
+        {'test': 'testa', 'metadata': {'key': 'val'}},
+        {'test': 'testb', 'metadata': {'key2': 'val2'}},
+    ]
+    with mock.patch.object(
+        publisher, '_DumpJson', wraps=publisher._DumpJson
+    ) as mock_dumps:
+      self.instance.PublishSamples()
+    self.assertEqual(2, mock_dumps.call_count)
+    self.assertEqual(files[0].read(), files[1].read())
+
+  def testPublishSamplesInBackground(self):
+
+    class BackgroundJSONPublisher(publisher.NewlineDelimitedJSONPublisher):
+      PUBLISH_IN_BACKGROUND = True
+
+    files = []
+    for _ in range(2):
+      f = tempfile.NamedTemporaryFile(mode='w+', suffix='.json')
+      self.addCleanup(f.close)
+      files.append(f)
+    self.instance.publishers = [BackgroundJSONPublisher(f.name) for f in files]
+    self.instance.samples = [{'test': 'testa', 'metadata': {'key': 'val'}}]
+    with mock.patch.object(
+        publisher, '_DumpJson', wraps=publisher._DumpJson
+    ) as mock_dumps, mock.patch.object(
+        publisher.background_tasks,
+        'RunThreaded',
+        wraps=publisher.background_tasks.RunThreaded,
+    ) as mock_run_threaded:
+      self.instance.PublishSamples()
+    mock_run_threaded.assert_called_once()
+    self.assertEqual(1, mock_dumps.call_count)
+    for f in files:
+      self.assertEqual({'test': 'testa', 'labels': '|key:val|'}, json.load(f))
+
+  def testSingleBackgroundPublisherRunsInline(self):
+    in_order = mock.MagicMock(PUBLISH_IN_BACKGROUND=False)
+    background = mock.MagicMock(PUBLISH_IN_BACKGROUND=True)
+    self.instance.publishers = [background, in_order]
+    self.instance.samples = [{'test': 'testa', 'metadata': {}}]
+    calls = []
+    background.PublishSamples.side_effect = lambda _: calls.append('background')
+    in_order.PublishSamples.side_effect = lambda _: calls.append('in_order')
+    with mock.patch.object(
+        publisher.background_tasks, 'RunThreaded'
+    ) as mock_run_threaded:
+      self.instance.PublishSamples()
+      self.instance.Flush()
+    mock_run_threaded.assert_not_called()
+    self.assertEqual(['background', 'in_order'], calls)
+
+  def testFlushRunsBackgroundPublishersConcurrently(self):
+    in_order = [mock.MagicMock(PUBLISH_IN_BACKGROUND=False) for _ in range(2)]
+    background = [mock.MagicMock(PUBLISH_IN_BACKGROUND=True) for _ in range(2)]
+    self.instance.publishers = in_order + background
+    with mock.patch.object(
+        publisher.background_tasks,
+        'RunThreaded',
+        wraps=publisher.background_tasks.RunThreaded,
+    ) as mock_run_threaded:
+      self.instance.Flush()
+    mock_run_threaded.assert_called_once_with(
+        mock.ANY,
+        [
+            ((0, in_order), {}),
+            ((1, background[:1]), {}),
+            ((2, background[1:]), {}),
+        ],
+    )
+    for p in self.instance.publishers:
+      p.Flush.assert_called_once_with()
+
+  def testBackgroundPublisherExceptionIsNotWrapped(self):
+    failing = mock.MagicMock(PUBLISH_IN_BACKGROUND=True)
+    failing.PublishSamples.side_effect = errors.VmUtil.CalledProcessException(
+        'bq load failed'
+    )
+    other = mock.MagicMock(PUBLISH_IN_BACKGROUND=True)
+    self.instance.publishers = [failing, other]
+    self.instance.samples = [{'test': 'testa', 'metadata': {}}]
+    with self.assertRaisesRegex(
+        errors.VmUtil.CalledProcessException, 'bq load failed'
+    ):
+      with self.assertNoLogs(level='ERROR'):
+        self.instance.PublishSamples()
+    other.PublishSamples.assert_called_once()
+
+  def testOnlyHiddenPublisherExceptionsAreLogged(self):
+    first = mock.MagicMock(PUBLISH_IN_BACKGROUND=True)
+    first.PublishSamples.side_effect = ValueError('first')
+    second = mock.MagicMock(PUBLISH_IN_BACKGROUND=True)
+    second.PublishSamples.side_effect = ValueError('second')
+    self.instance.publishers = [first, second]
+    self.instance.samples = [{'test': 'testa', 'metadata': {}}]
+    with self.assertRaisesRegex(ValueError, 'first'):
+      with self.assertLogs(level='ERROR') as logs:
+        self.instance.PublishSamples()
+    self.assertEqual(1, len(logs.records))
+    self.assertIn('second', logs.output[0])
+
 
 def CreateMockVM(hostname='Hostname', vm_id='12345', ip_address='1.2.3.4'):
   mock_vm = mock.MagicMock(
@@ -462,6 +726,8 @@ class DefaultMetadataProviderTestCase(unittest.TestCase):
         'vm_names': 'Hostname,foo,bar',
     }
     self._RunTest(mock_spec, expected)
+    for vm in mock_spec.vms:
+      vm.GetResourceMetadata.assert_called_once_with()
 
 
 class CSVPublisherTestCase(unittest.TestCase):
@@ -535,6 +801,150 @@ class CSVPublisherTestCase(unittest.TestCase):
     self.assertEqual(3, len(rows))
 
 
+class ElasticsearchPublisherTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self.mock_es_module = mock.MagicMock()
+    p = mock.patch.dict(sys.modules, {'elasticsearch': self.mock_es_module})
+    p.start()
+    self.addCleanup(p.stop)
+    publisher._ImportElasticsearch.cache_clear()
+    self.addCleanup(publisher._ImportElasticsearch.cache_clear)
+    self.mock_es = self.mock_es_module.Elasticsearch.return_value
+    self.mock_es.indices.exists.return_value = False
+    self.mock_es.info.return_value = {'version': {'number': '7.10.0'}}
+    self.samples = [{
+        'test': 'testa',
+        'metric': 'widgets',
+        'value': 1.0,
+        'timestamp': 1417647763.387665,
+        'sample_uri': 'abc',
+        'metadata': {'a': 'c'},
+    }]
+
+  def testPublishSamplesCreatesIndexOnce(self):
+    instance = publisher.ElasticsearchPublisher(
+        es_uri='http://localhost:9200', es_index='Perfkit', es_type='result'
+    )
+    instance.PublishSamples(self.samples)
+    instance.PublishSamples(self.samples)
+    self.mock_es.indices.exists.assert_called_once_with(index='perfkit')
+    self.mock_es.indices.create.assert_called_once_with(
+        index='perfkit', body=publisher._ES_MAPPING_5_PLUS
+    )
+
+  def testEachInstanceChecksIndex(self):
+    for _ in range(2):
+      publisher.ElasticsearchPublisher(
+          es_uri='http://localhost:9200', es_index='perfkit', es_type='result'
+      ).PublishSamples(self.samples)
+    self.assertEqual(2, self.mock_es.indices.exists.call_count)
+
+  def testPublishSamplesInBulk(self):
+    bulk_actions = []
+
+    def _ParallelBulk(es, actions, **kwargs):
+      del es, kwargs
+      for action in actions:
+        bulk_actions.append(action)
+        yield True, {}
+
+    self.mock_es_module.helpers.parallel_bulk.side_effect = _ParallelBulk
+    instance = publisher.ElasticsearchPublisher(
+        es_uri='http://localhost:9200', es_index='perfkit', es_type='result'
+    )
+    instance.PublishSamples(self.samples * 2)
+    self.mock_es_module.helpers.parallel_bulk.assert_called_once_with(
+        self.mock_es, mock.ANY, thread_count=mock.ANY, chunk_size=mock.ANY
+    )
+    self.mock_es.create.assert_not_called()
+    self.assertEqual(2, len(bulk_actions))
+    source = bulk_actions[0].pop('_source')
+    self.assertEqual(
+        {
+            '_op_type': 'create',
+            '_index': 'perfkit',
+            '_type': 'result',
+            '_id': 'abc',
+        },
+        bulk_actions[0],
+    )
+    self.assertEqual(
+        {
+            'test': 'testa',
+            'metric': 'widgets',
+            'value': 1.0,
+            'timestamp': '2014-12-03 23:02:43.387665',
+            'sample_uri': 'abc',
+            'metadata': {'a': 'c'},
+        },
+        json.loads(source),
+    )
+
+  def testCustomJsonDumps(self):
+    bulk_actions = []
+
+    def _ParallelBulk(es, actions, **kwargs):
+      del es, kwargs
+      bulk_actions.extend(actions)
+      return []
+
+    self.mock_es_module.helpers.parallel_bulk.side_effect = _ParallelBulk
+    instance = publisher.ElasticsearchPublisher(
+        es_uri='http://localhost:9200',
+        es_index='perfkit',
+        es_type='result',
+        json_dumps=lambda sample: 'custom',
+    )
+    instance.PublishSamples(self.samples)
+    self.assertEqual(['custom'], [a['_source'] for a in bulk_actions])
+
+  def testSourceFormatMatchesWithoutOrjson(self):
+    bulk_actions = []
+
+    def _ParallelBulk(es, actions, **kwargs):
+      del es, kwargs
+      bulk_actions.extend(actions)
+      return []
+
+    self.mock_es_module.helpers.parallel_bulk.side_effect = _ParallelBulk
+    instance = publisher.ElasticsearchPublisher(
+        es_uri='http://localhost:9200', es_index='perfkit', es_type='result'
+    )
+    self.samples[0]['value'] = float('nan')
+    self.samples[0]['metadata'] = {'a': 'caf\u00e9'}
+    instance.PublishSamples(self.samples)
+    with mock.patch.object(publisher, 'orjson', None):
+      instance.PublishSamples(self.samples)
+    expected = (
+        '{"test":"testa","metric":"widgets","value":NaN,'
+        '"timestamp":"2014-12-03 23:02:43.387665","sample_uri":"abc",'
+        '"metadata":{"a":"caf\u00e9"}}'
+    )
+    self.assertEqual(
+        [expected, expected], [a['_source'] for a in bulk_actions]
+    )
+
+  def testDeDotKeysLeavesSampleUnchanged(self):
+    instance = publisher.ElasticsearchPublisher(
+        es_uri='http://localhost:9200', es_index='perfkit', es_type='result'
+    )
+    sample = {'metadata': {'a.b': 'c', 'd': {'e.f': 'g'}}}
+    self.assertEqual(
+        {'metadata': {'a_b': 'c', 'd': {'e_f': 'g'}}},
+        instance._deDotKeys(sample),
+    )
+    self.assertEqual({'metadata': {'a.b': 'c', 'd': {'e.f': 'g'}}}, sample)
+
+  def testMissingElasticsearchPackage(self):
+    instance = publisher.ElasticsearchPublisher(
+        es_uri='http://localhost:9200', es_index='perfkit', es_type='result'
+    )
+    with mock.patch.dict(sys.modules, {'elasticsearch': None}):
+      with self.assertRaisesRegex(ImportError, 'elasticsearch'):
+        instance.PublishSamples(self.samples)
+
+
 class InfluxDBPublisherTestCase(unittest.TestCase):
 
   def setUp(self):
@@ -693,6 +1103,99 @@ class InfluxDBPublisherTestCase(unittest.TestCase):
 
     self.assertEqual(constructed_sample, sample_results)
 
+  @mock.patch.object(publisher.httplib, 'HTTPConnection')
+  def testReusesConnection(self, mock_connection_class):
+    mock_conn = mock_connection_class.return_value
+    mock_conn.getresponse.return_value.status = 204
+    self.test_db._Publish(['a'])
+    self.test_db._Publish(['b'])
+    mock_connection_class.assert_called_once_with(self.db_uri)
+    self.assertEqual(
+        [
+            mock.call(
+                'POST',
+                '/query?q=CREATE+DATABASE+test_db',
+                None,
+                headers=mock.ANY,
+            ),
+            mock.call('POST', '/write?db=test_db', b'a', headers=mock.ANY),
+            mock.call('POST', '/write?db=test_db', b'b', headers=mock.ANY),
+        ],
+        mock_conn.request.call_args_list,
+    )
+
+  @mock.patch.object(publisher.httplib, 'HTTPConnection')
+  def testWritesUtf8Body(self, mock_connection_class):
+    mock_conn = mock_connection_class.return_value
+    mock_conn.getresponse.return_value.status = 204
+    self.test_db._Publish(['a,x=\u00b5s', 'b,x=\u2603'])
+    mock_conn.request.assert_called_with(
+        'POST',
+        '/write?db=test_db',
+        'a,x=\u00b5s\nb,x=\u2603'.encode('utf-8'),
+        headers=mock.ANY,
+    )
+
+  @mock.patch.object(publisher.httplib, 'HTTPConnection')
+  def testCompressesBody(self, mock_connection_class):
+    mock_conn = mock_connection_class.return_value
+    mock_conn.getresponse.return_value.status = 204
+    instance = publisher.InfluxDBPublisher(
+        self.db_uri, self.db_name, compress=True
+    )
+    instance._Publish(['a', 'b'])
+    _, url, body = mock_conn.request.call_args[0]
+    self.assertEqual('/write?db=test_db', url)
+    self.assertEqual(b'a\nb', gzip.decompress(body))
+    self.assertEqual(
+        'gzip', mock_conn.request.call_args[1]['headers']['Content-Encoding']
+    )
+
+  @mock.patch.object(publisher.httplib, 'HTTPConnection')
+  def testReconnectsAfterStaleConnection(self, mock_connection_class):
+    stale_conn, new_conn = mock.MagicMock(), mock.MagicMock()
+    mock_connection_class.side_effect = [stale_conn, new_conn]
+    stale_conn.getresponse.side_effect = [
+        mock.MagicMock(status=204),
+        mock.MagicMock(status=204),
+        publisher.httplib.RemoteDisconnected(),
+    ]
+    new_conn.getresponse.return_value.status = 204
+    self.test_db._Publish(['a'])
+    self.test_db._Publish(['b'])
+    stale_conn.close.assert_called_once_with()
+    new_conn.request.assert_called_once_with(
+        'POST', '/write?db=test_db', b'b', headers=mock.ANY
+    )
+
+  @mock.patch.object(publisher.InfluxDBPublisher, '_Publish')
+  @mock.patch.object(publisher.InfluxDBPublisher, '_ConstructSample')
+  def testBatchWritesOnFlush(self, mock_construct_sample, mock_publish):
+    mock_construct_sample.side_effect = lambda sample: sample['line']
+    instance = publisher.InfluxDBPublisher(
+        self.db_uri, self.db_name, batch=True
+    )
+    instance.PublishSamples([{'line': 'a'}])
+    instance.PublishSamples([{'line': 'b'}, {'line': 'c'}])
+    mock_publish.assert_not_called()
+    instance.Flush()
+    mock_publish.assert_called_once_with(['a', 'b', 'c'])
+    instance.Flush()
+    mock_publish.assert_called_once()
+
+  @mock.patch.object(publisher.InfluxDBPublisher, '_Publish')
+  @mock.patch.object(publisher.InfluxDBPublisher, '_ConstructSample')
+  def testBatchWritesWhenFull(self, mock_construct_sample, mock_publish):
+    mock_construct_sample.side_effect = lambda sample: sample['line']
+    instance = publisher.InfluxDBPublisher(
+        self.db_uri, self.db_name, batch=True
+    )
+    instance.MAX_BATCH_SIZE = 4
+    instance.PublishSamples([{'line': 'a'}])
+    mock_publish.assert_not_called()
+    instance.PublishSamples([{'line': 'b'}])
+    mock_publish.assert_called_once_with(['a', 'b'])
+
   @mock.patch.object(publisher.InfluxDBPublisher, '_Publish')
   def testPublishSamples(self, mock_publish_method):
     samples = [
@@ -816,6 +1319,19 @@ class LabelEncodingTestCase(unittest.TestCase):
         labels_str,
     )
 
+  def testDecodeSpecialCharacters(self):
+    labels_str = '|a:x|y|,|b:1,2|,|c:|,|d:line1\nline2|,|e:ends_with_pipe||'
+    self.assertEqual(
+        {
+            'a': 'x|y',
+            'b': '1,2',
+            'c': '',
+            'd': 'line1\nline2',
+            'e': 'ends_with_pipe|',
+        },
+        publisher.LabelsToDict(labels_str),
+    )
+
   def testEncodeSortsByKey(
       self,
   ):
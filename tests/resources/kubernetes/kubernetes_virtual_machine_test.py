@@ -185,20 +185,16 @@ _EXPECTED_CALL_BODY_WITH_VM_GROUP = """
 """
 
 
-def get_write_mock_from_temp_file_mock(temp_file_mock):
-  """Returns the write method mock from the NamedTemporaryFile mock.
+def get_stdin_from_issue_command_mock(issue_command_mock):
+  """Returns the resource body piped to kubectl by the last IssueCommand call.
 
-  This can be used to make assertions about the calls make to write(),
-  which exists on the instance returned from the NamedTemporaryFile mock.
-
-  The reason for the __enter__() in this context is due to the fact
-  that NamedTemporaryFile is used in a context manager inside
-  kubernetes_helper.py.
+  kubernetes_helper passes resource bodies to `kubectl create -f -` on stdin
+  rather than through a temporary file.
 
   Args:
-   temp_file_mock: mock object of the NamedTemporaryFile() contextManager
+   issue_command_mock: mock object of vm_util.IssueCommand
   """
-  return temp_file_mock().__enter__().write
+  return issue_command_mock.call_args[1]['stdin']
 
 
 @contextlib2.contextmanager
@@ -214,10 +210,9 @@ def patch_critical_objects(stdout='', stderr='', return_code=0, flags=FLAGS):
     stack.enter_context(mock.patch(builtins.__name__ + '.open'))
     stack.enter_context(mock.patch(vm_util.__name__ + '.PrependTempDir'))
 
-    # Save and return the temp_file mock here so that we can access the write()
-    # call on the instance that the mock returned. This allows us to verify
-    # that the body of the file is what we expect it to be (useful for
-    # verifying that the pod.yml body was written correctly).
+    # Resource bodies are piped to kubectl on stdin, so they can be inspected
+    # through the IssueCommand mock. The temp_file mock is still returned for
+    # tests that exercise code paths which write local files.
     temp_file = stack.enter_context(
         mock.patch(vm_util.__name__ + '.NamedTemporaryFile')
     )
@@ -245,11 +240,7 @@ class BaseKubernetesVirtualMachineTestCase(
 ):
 
   def assertJsonEqual(self, str1, str2):
-    json1 = json.loads(str1)
-    json2 = json.loads(str2)
-    self.assertEqual(
-        json.dumps(json1, sort_keys=True), json.dumps(json2, sort_keys=True)
-    )
+    self.assertEqual(json.loads(str1), json.loads(str2))
 
 
 class KubernetesResourcesTestCase(BaseKubernetesVirtualMachineTestCase):
@@ -323,11 +314,12 @@ class KubernetesVirtualMachineOsTypesTestCase(
     kub_vm._Create()
 
   def testCreateUbuntu1604(self):
-    with patch_critical_objects() as (_, temp_file):
+    with patch_critical_objects() as (issue_command, _):
       self.create_kubernetes_vm(os_types.UBUNTU1604)
 
-      write_mock = get_write_mock_from_temp_file_mock(temp_file)
-      create_json = json.loads(write_mock.call_args[0][0])
+      create_json = json.loads(
+          get_stdin_from_issue_command_mock(issue_command)
+      )
       self.assertEqual(
           create_json['spec']['containers'][0]['image'], 'ubuntu:16.04'
       )
@@ -396,12 +388,12 @@ class KubernetesVirtualMachineVmGroupAffinityTestCase(
     kub_vm._Create()
 
   def testCreateVmGroupAffinity(self):
-    with patch_critical_objects() as (_, temp_file):
+    with patch_critical_objects() as (issue_command, _):
       self.create_kubernetes_vm()
 
-      write_mock = get_write_mock_from_temp_file_mock(temp_file)
       self.assertJsonEqual(
-          write_mock.call_args[0][0], _EXPECTED_CALL_BODY_WITH_VM_GROUP
+          get_stdin_from_issue_command_mock(issue_command),
+          _EXPECTED_CALL_BODY_WITH_VM_GROUP,
       )
 
 
@@ -435,7 +427,7 @@ class KubernetesVirtualMachineTestCase(BaseKubernetesVirtualMachineTestCase):
 
   def testCreatePodBodyWrittenCorrectly(self):
     spec = self.create_virtual_machine_spec()
-    with patch_critical_objects() as (_, temp_file):
+    with patch_critical_objects() as (issue_command, _):
       kub_vm = TestKubernetesVirtualMachine(spec)
       # Need to set the name explicitly on the instance because the test
       # running is currently using a single PKB instance, so the BaseVm
@@ -445,11 +437,22 @@ class KubernetesVirtualMachineTestCase(BaseKubernetesVirtualMachineTestCase):
       kub_vm._WaitForPodBootCompletion = lambda: None
       kub_vm._Create()
 
-      write_mock = get_write_mock_from_temp_file_mock(temp_file)
       self.assertJsonEqual(
-          write_mock.call_args[0][0], _EXPECTED_CALL_BODY_WITHOUT_GPUS
+          get_stdin_from_issue_command_mock(issue_command),
+          _EXPECTED_CALL_BODY_WITHOUT_GPUS,
       )
 
+  def testExists(self):
+    spec = self.create_virtual_machine_spec()
+    with patch_critical_objects(stdout='pod/%s\n' % _NAME) as (
+        issue_command,
+        _,
+    ):
+      kub_vm = TestKubernetesVirtualMachine(spec)
+      kub_vm.name = _NAME
+      self.assertTrue(kub_vm._Exists())
+      self.assertIn('-o=name', issue_command.call_args[0][0])
+
   def testDownloadPreprovisionedDataAws(self):
     spec = self.create_virtual_machine_spec()
     vm_class = virtual_machine.GetVmClass(
@@ -526,7 +529,7 @@ class KubernetesVirtualMachineWithGpusTestCase(
 
   def testCreatePodBodyWrittenCorrectly(self):
     spec = self.create_virtual_machine_spec()
-    with patch_critical_objects() as (_, temp_file):
+    with patch_critical_objects() as (issue_command, _):
       kub_vm = TestKubernetesVirtualMachine(spec)
       # Need to set the name explicitly on the instance because the test
       # running is currently using a single PKB instance, so the BaseVm
@@ -536,9 +539,9 @@ class KubernetesVirtualMachineWithGpusTestCase(
       kub_vm._WaitForPodBootCompletion = lambda: None
       kub_vm._Create()
 
-      write_mock = get_write_mock_from_temp_file_mock(temp_file)
       self.assertJsonEqual(
-          write_mock.call_args[0][0], _EXPECTED_CALL_BODY_WITH_2_GPUS
+          get_stdin_from_issue_command_mock(issue_command),
+          _EXPECTED_CALL_BODY_WITH_2_GPUS,
       )
 
 
@@ -561,7 +564,7 @@ class KubernetesVirtualMachineWithNvidiaCudaImage(
     vm_class = virtual_machine.GetVmClass(
         provider_info.GCP, os_types.UBUNTU1604_CUDA9, provider_info.KUBERNETES
     )
-    with patch_critical_objects() as (_, temp_file):
+    with patch_critical_objects() as (issue_command, _):
       kub_vm = vm_class(spec)
       # Need to set the name explicitly on the instance because the test
       # running is currently using a single PKB instance, so the BaseVm
@@ -571,9 +574,9 @@ class KubernetesVirtualMachineWithNvidiaCudaImage(
       kub_vm._WaitForPodBootCompletion = lambda: None
       kub_vm._Create()
 
-      write_mock = get_write_mock_from_temp_file_mock(temp_file)
       self.assertJsonEqual(
-          write_mock.call_args[0][0], _EXPECTED_CALL_BODY_WITH_NVIDIA_CUDA_IMAGE
+          get_stdin_from_issue_command_mock(issue_command),
+          _EXPECTED_CALL_BODY_WITH_NVIDIA_CUDA_IMAGE,
       )
 
 
@@ -0,0 +1,75 @@
+# Copyright 2026 PerfKitBenchmarker Authors. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for perfkitbenchmarker.test_util."""
+
+import unittest
+from perfkitbenchmarker import sample
+from perfkitbenchmarker import test_util
+
+
+class AssertSamplesSubsetTestCase(
+    unittest.TestCase, test_util.SamplesTestMixin
+):
+
+  def setUp(self):
+    super().setUp()
+    self.samples = [
+        sample.Sample('ops', 500.0, 'ops/s', {'threads': 1}, timestamp=1),
+        sample.Sample('ops', 600.0, 'ops/s', {'threads': 2}, timestamp=2),
+        sample.Sample('latency', 3, 'ms', {}, timestamp=3),
+    ]
+
+  def testSubsetIgnoresTimestamp(self):
+    self.assertSamplesSubset(
+        [
+            sample.Sample('ops', 600.0, 'ops/s', {'threads': 2}, timestamp=9),
+            sample.Sample('latency', 3, 'ms', {}, timestamp=9),
+        ],
+        self.samples,
+    )
+
+  def testEmptySubset(self):
+    self.assertSamplesSubset([], self.samples)
+
+  def testAlmostEqualValueMissingIndexIsFound(self):
+    self.assertSamplesSubset(
+        [sample.Sample('ops', 500.00000049, 'ops/s', {'threads': 1})],
+        [sample.Sample('ops', 500.00000051, 'ops/s', {'threads': 1})],
+    )
+
+  def testMissingSampleRaises(self):
+    with self.assertRaises(AssertionError):
+      self.assertSamplesSubset(
+          [sample.Sample('ops', 700.0, 'ops/s', {'threads': 1})],
+          self.samples,
+      )
+
+  def testMismatchedMetadataRaises(self):
+    with self.assertRaises(AssertionError):
+      self.assertSamplesSubset(
+          [sample.Sample('ops', 500.0, 'ops/s', {'threads': 2})],
+          self.samples,
+      )
+
+  def testCustomMessage(self):
+    with self.assertRaisesRegex(AssertionError, 'custom message'):
+      self.assertSamplesSubset(
+          [sample.Sample('latency', 4, 'ms', {})],
+          self.samples,
+          msg='custom message',
+      )
+
+
+if __name__ == '__main__':
+  unittest.main()
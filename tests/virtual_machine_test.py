@@ -13,11 +13,14 @@
 # limitations under the License.
 """Tests for perfkitbenchmarker.virtual_machine."""
 
+import pathlib
 import unittest
 from absl import flags
+import jinja2
 import mock
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import virtual_machine
+from perfkitbenchmarker import vm_util
 from perfkitbenchmarker.configs import option_decoders
 from tests import pkb_common_test_case
 
@@ -225,5 +228,41 @@ class TestInstallData(pkb_common_test_case.PkbCommonTestCase):
     check.assert_not_called()
 
 
+
+class RenderTemplateTest(pkb_common_test_case.PkbCommonTestCase):
+
+  def testRendersWithVmAndContext(self):
+    vm = CreateTestVm()
+    temp_dir = self.create_tempdir().full_path
+    self.enter_context(
+        mock.patch.object(vm_util, 'GetTempDir', return_value=temp_dir)
+    )
+    template = self.create_tempfile(content='{{ vm.name }}:{{ port }}')
+    rendered = []
+
+    def _RemoteCopy(path, unused_remote_path):
+      rendered.append(pathlib.Path(path).read_text())
+
+    with mock.patch.object(
+        vm, 'RemoteCopy', side_effect=_RemoteCopy
+    ) as remote_copy:
+      vm.RenderTemplate(template.full_path, '/remote/conf', {'port': 80})
+      vm.RenderTemplate(template.full_path, '/remote/conf', {'port': 81})
+    remote_copy.assert_called_with(mock.ANY, '/remote/conf')
+    self.assertEqual([f'{vm.name}:80', f'{vm.name}:81'], rendered)
+
+  def testMissingContextRaises(self):
+    vm = CreateTestVm()
+    self.enter_context(
+        mock.patch.object(
+            vm_util, 'GetTempDir', return_value=self.create_tempdir().full_path
+        )
+    )
+    template = self.create_tempfile(content='{{ missing }}')
+    with mock.patch.object(vm, 'RemoteCopy'):
+      with self.assertRaises(jinja2.UndefinedError):
+        vm.RenderTemplate(template.full_path, '/remote/conf', {})
+
+
 if __name__ == '__main__':
   unittest.main()
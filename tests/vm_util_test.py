@@ -16,10 +16,10 @@
 
 import os
 import subprocess
-import threading
 import time
 import unittest
 from absl import flags
+from absl.testing import flagsaver
 import mock
 from perfkitbenchmarker import errors
 from perfkitbenchmarker import vm_util
@@ -82,46 +82,6 @@ def HaveSleepSubprocess():
   return False
 
 
-class WaitUntilSleepTimer(threading.Thread):
-  """Timer that waits for a sleep subprocess to appear.
-
-  This is intended for specific tests that want to trigger timer
-  expiry as soon as it detects that a subprocess is executing a
-  "sleep" command.
-
-  It assumes that the test driver is not parallelizing the tests using
-  this method since that may lead to inconsistent results.
-  TODO(user): If that's an issue, could add a unique fractional part
-  to the sleep command args to distinguish them.
-  """
-
-  def __init__(self, interval, function):
-    threading.Thread.__init__(self)
-    self.end_time = time.time() + interval
-    self.function = function
-    self.finished = threading.Event()
-    self.have_sleep = threading.Event()
-
-    def WaitForSleep():
-      while not self.finished.is_set():
-        if HaveSleepSubprocess():
-          self.have_sleep.set()
-          break
-        time.sleep(0)  # yield to other Python threads
-
-    threading.Thread(target=WaitForSleep).run()
-
-  def cancel(self):
-    self.finished.set()
-
-  def run(self):
-    while time.time() < self.end_time and not self.have_sleep.is_set():
-      time.sleep(0)  # yield to other Python threads
-    if not self.finished.is_set():
-      self.function()
-    self.finished.set()
-
-
 class IssueCommandTestCase(pkb_common_test_case.PkbCommonTestCase):
 
   def setUp(self):
@@ -132,7 +92,6 @@ class IssueCommandTestCase(pkb_common_test_case.PkbCommonTestCase):
     _, _, retcode = vm_util.IssueCommand(['sleep', '0s'])
     self.assertEqual(retcode, 0)
 
-  @mock.patch('threading.Timer', new=WaitUntilSleepTimer)
   def testTimeoutReachedThrows(self):
     with self.assertRaises(errors.VmUtil.IssueCommandTimeoutError):
       _, _, _ = vm_util.IssueCommand(
@@ -140,7 +99,6 @@ class IssueCommandTestCase(pkb_common_test_case.PkbCommonTestCase):
       )
     self.assertFalse(HaveSleepSubprocess())
 
-  @mock.patch('threading.Timer', new=WaitUntilSleepTimer)
   def testTimeoutReached(self):
     _, _, retcode = vm_util.IssueCommand(
         ['sleep', '2s'],
@@ -151,6 +109,15 @@ class IssueCommandTestCase(pkb_common_test_case.PkbCommonTestCase):
     self.assertEqual(retcode, -9)
     self.assertFalse(HaveSleepSubprocess())
 
+  def testDecodesUtf8Output(self):
+    stdout, _, _ = vm_util.IssueCommand(['printf', 'caf\\303\\251 \\377'])
+    self.assertEqual('caf\u00e9 \ufffd', stdout)
+
+  def testWritesStdin(self):
+    stdout, _, retcode = vm_util.IssueCommand(['cat'], stdin='pod body')
+    self.assertEqual('pod body', stdout)
+    self.assertEqual(retcode, 0)
+
   def testNoTimeout(self):
     _, _, retcode = vm_util.IssueCommand(['sleep', '0s'], timeout=None)
     self.assertEqual(retcode, 0)
@@ -161,6 +128,16 @@ class IssueCommandTestCase(pkb_common_test_case.PkbCommonTestCase):
     self.assertIn('Running: sleep 0s', logs.output[0])
     self.assertIn('Ran: {sleep 0s}\nReturnCode:0', logs.output[1])
 
+  @flagsaver.flagsaver(
+      vm_command_log_mode=vm_util.VmCommandLogMode.LOG_ON_ERROR
+  )
+  def testLogOnErrorOnlyLogsFailures(self):
+    with self.assertLogs(level='INFO') as logs:
+      vm_util.IssueCommand(['true'])
+      vm_util.IssueCommand(['false'], raise_on_failure=False)
+    self.assertNotIn('Ran: {true}', '\n'.join(logs.output))
+    self.assertIn('Ran: {false}\nReturnCode:1', logs.output[-1])
+
   def testLogsSemicolonWarning(self):
     with mock.patch('subprocess.Popen', spec=subprocess.Popen) as mock_popen:
       with self.assertLogs(level='WARNING') as logs:
@@ -237,6 +214,88 @@ class IssueCommandTestCase(pkb_common_test_case.PkbCommonTestCase):
     )
 
 
+class RetryTest(pkb_common_test_case.PkbCommonTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.mock_sleep = self.enter_context(mock.patch.object(time, 'sleep'))
+
+  def _CallUntilRetriesExceeded(self, **retry_kwargs):
+    @vm_util.Retry(max_retries=4, timeout=-1, fuzz=0, **retry_kwargs)
+    def _AlwaysFails():
+      raise ValueError()
+
+    with self.assertRaises(vm_util.RetriesExceededRetryError):
+      _AlwaysFails()
+    return [c.args[0] for c in self.mock_sleep.call_args_list]
+
+  def testConstantInterval(self):
+    self.assertEqual(
+        [2, 2, 2, 2], self._CallUntilRetriesExceeded(poll_interval=2)
+    )
+
+  def testExponentialBackoff(self):
+    self.assertEqual(
+        [1, 2, 4, 4],
+        self._CallUntilRetriesExceeded(poll_interval=1, max_backoff_exp=2),
+    )
+
+  def testBackoffCap(self):
+    self.assertEqual(
+        [1, 2, 3, 3],
+        self._CallUntilRetriesExceeded(
+            poll_interval=1, max_backoff_exp=10, backoff_cap=3
+        ),
+    )
+
+  def testBackoffPolicy(self):
+    policies = iter([(1, 3), (1, 3), None, None, None])
+    self.assertEqual(
+        [1, 2, 5, 5],
+        self._CallUntilRetriesExceeded(
+            poll_interval=5, backoff_policy=lambda e: next(policies)
+        ),
+    )
+
+  @mock.patch.object(vm_util, 'IssueCommand')
+  def testIssueRetryableCommandBacksOffWhenThrottled(self, mock_cmd):
+    mock_cmd.side_effect = [
+        ('', 'ERROR: RESOURCE_EXHAUSTED: Quota exceeded', 1),
+        ('', 'ERROR: RESOURCE_EXHAUSTED: Quota exceeded', 1),
+        ('', 'ERROR: instance not ready', 1),
+        ('out', '', 0),
+    ]
+    FLAGS['default_timeout'].parse(-1)
+    with mock.patch.object(vm_util.random, 'random', return_value=1):
+      self.assertEqual(
+          ('out', ''),
+          vm_util.IssueRetryableCommand(['/usr/bin/gcloud', 'compute']),
+      )
+    self.assertEqual(
+        [5, 10, vm_util.POLL_INTERVAL],
+        [c.args[0] for c in self.mock_sleep.call_args_list],
+    )
+
+  def testRetryableCommandBackoffUsesCommandAndStderr(self):
+    self.assertEqual(
+        (5, 3),
+        vm_util._RetryableCommandBackoff(
+            errors.VmUtil.CalledProcessException(
+                'failed', cmd=['/usr/local/bin/aws', 'ec2'], stderr='Throttling'
+            )
+        ),
+    )
+
+  def testRetryableCommandBackoffIgnoresMessageText(self):
+    self.assertIsNone(
+        vm_util._RetryableCommandBackoff(
+            errors.VmUtil.CalledProcessException(
+                'Ran: {gcloud compute}\nSTDERR: RESOURCE_EXHAUSTED'
+            )
+        )
+    )
+
+
 class VmUtilTest(pkb_common_test_case.PkbCommonTestCase):
 
   def setUp(self):
@@ -252,6 +311,169 @@ class VmUtilTest(pkb_common_test_case.PkbCommonTestCase):
         'sed -i -r "s|current|new|" test_file'
     )
 
+  @flagsaver.flagsaver(ssh_reuse_connections=False, use_ipv6=False)
+  def testGetSshOptionsFollowsFlags(self):
+    options = vm_util.GetSshOptions('key')
+    self.assertIn('ConnectTimeout=5', options)
+    self.assertEqual(['-i', 'key'], options[-2:])
+    FLAGS.ssh_options = ['-v']
+    FLAGS.use_ipv6 = True
+    options = vm_util.GetSshOptions('other_key', connect_timeout=10)
+    self.assertIn('ConnectTimeout=10', options)
+    self.assertEqual(['-i', 'other_key', '-6', '-v'], options[-4:])
+
+  @mock.patch.object(vm_util, 'IssueCommand')
+  def testShutdownSshMasters(self, mock_cmd):
+    FLAGS.ssh_reuse_connections = True
+    linux_vm = mock.Mock(
+        ip_address='1.2.3.4', ssh_port=22, user_name='perfkit', is_static=False
+    )
+    linux_vm.GetConnectionIp.return_value = '1.2.3.4'
+    windows_vm = mock.Mock(spec=['ip_address'], ip_address='5.6.7.8')
+    vm_util.ShutdownSshMasters([linux_vm, windows_vm])
+    mock_cmd.assert_called_once()
+    cmd = mock_cmd.call_args[0][0]
+    self.assertEqual(['ssh', '-O', 'exit', '-p', '22'], cmd[:5])
+    self.assertEqual('perfkit@1.2.3.4', cmd[-1])
+
+  @mock.patch.object(vm_util, 'IssueCommand')
+  def testShutdownSshMastersWithoutReuse(self, mock_cmd):
+    FLAGS.ssh_reuse_connections = False
+    vm_util.ShutdownSshMasters([mock.Mock()])
+    mock_cmd.assert_not_called()
+
+  def testCopyFileBetweenVms(self):
+    src_vm, dest_vm = mock.Mock(), mock.Mock()
+    vm_util.CopyFileBetweenVms('f.txt', src_vm, '/src', dest_vm, '/dest')
+    src_vm.RemoteCopy.assert_called_once_with(
+        mock.ANY, '/src/f.txt', copy_to=False
+    )
+    temp_path = src_vm.RemoteCopy.call_args[0][0]
+    dest_vm.RemoteCopy.assert_called_once_with(
+        temp_path, '/dest/f.txt', copy_to=True
+    )
+    self.assertFalse(os.path.exists(temp_path))
+
+  def testTempPath(self):
+    path = vm_util.TempPath(prefix='pkb-test', suffix='.txt')
+    self.assertFalse(os.path.exists(path))
+    self.assertTrue(os.path.basename(path).startswith('pkb-test-'))
+    self.assertTrue(path.endswith('.txt'))
+    self.assertNotEqual(path, vm_util.TempPath(prefix='pkb-test'))
+
+  def testGetLastRunUri(self):
+    runs_dir = self.create_tempdir()
+    self.enter_context(
+        mock.patch.object(
+            vm_util.temp_dir,
+            'GetAllRunsDirPath',
+            return_value=runs_dir.full_path,
+        )
+    )
+    self.assertIsNone(vm_util.GetLastRunUri())
+    for run_uri, mtime in (('aaaa', 300), ('bbbb', 100), ('cccc', 200)):
+      os.utime(runs_dir.mkdir(run_uri).full_path, (mtime, mtime))
+    runs_dir.create_file('not_a_run')
+    self.assertEqual('aaaa', vm_util.GetLastRunUri())
+
+  def testGetLastRunUriSkipsRemovedEntries(self):
+    runs_dir = self.create_tempdir()
+    os.utime(runs_dir.mkdir('aaaa').full_path, (100, 100))
+    self.enter_context(
+        mock.patch.object(
+            vm_util.temp_dir,
+            'GetAllRunsDirPath',
+            return_value=runs_dir.full_path,
+        )
+    )
+    removed = mock.Mock()
+    removed.name = 'bbbb'
+    removed.is_dir.return_value = True
+    removed.stat.side_effect = FileNotFoundError()
+    entries = mock.MagicMock()
+    entries.__iter__.return_value = [removed] + list(
+        os.scandir(runs_dir.full_path)
+    )
+    self.enter_context(
+        mock.patch.object(vm_util.os, 'scandir', return_value=entries)
+    )
+    self.assertEqual('aaaa', vm_util.GetLastRunUri())
+
+  def testGetLastRunUriWithoutRunsDir(self):
+    self.enter_context(
+        mock.patch.object(
+            vm_util.temp_dir, 'GetAllRunsDirPath', return_value='/nonexistent'
+        )
+    )
+    self.assertIsNone(vm_util.GetLastRunUri())
+
+  def testExecutableOnPath(self):
+    self.assertTrue(vm_util.ExecutableOnPath('sh'))
+    self.assertFalse(vm_util.ExecutableOnPath('pkb-no-such-executable'))
+
+  def testGenerateRandomWindowsPassword(self):
+    password = vm_util.GenerateRandomWindowsPassword(20, special_chars='!')
+    self.assertLen(password, 20)
+    self.assertRegex(password, r'^[a-z][A-Z][0-9]![a-zA-Z0-9!]{16}$')
+
+  def testParseTimeCommandResult(self):
+    self.assertEqual(
+        83.25,
+        vm_util.ParseTimeCommandResult(
+            'output\n\nreal\t1m23.250s\nuser\t0m0.010s\nsys\t0m0.020s\n'
+        ),
+    )
+
+  def testGenerateSSHConfig(self):
+    self.enter_context(
+        mock.patch.object(
+            vm_util, 'GetTempDir', return_value=self.create_tempdir().full_path
+        )
+    )
+    vm = mock.Mock(
+        ip_address='1.2.3.4',
+        user_name='perfkit',
+        ssh_port=22,
+        ssh_private_key='/key',
+    )
+    vm.name = 'pkb-vm'
+    vm_util.GenerateSSHConfig([vm], {'clients': [vm]})
+    with open(os.path.join(vm_util.GetTempDir(), 'ssh_config')) as f:
+      ssh_config = f.read()
+    self.assertIn('Host pkb-vm vm0\n  HostName=1.2.3.4\n', ssh_config)
+    self.assertIn('Host clients-0\n  HostName=1.2.3.4\n', ssh_config)
+
+  def testLoadJinjaTemplateReloadsChangedFile(self):
+    template_file = self.create_tempfile(content='a{{ x }}')
+    template = vm_util.LoadJinjaTemplate(template_file.full_path)
+    self.assertIs(template, vm_util.LoadJinjaTemplate(template_file.full_path))
+    self.assertEqual('a1', template.render(x=1))
+    template_file.write_text('b{{ x }}')
+    os.utime(template_file.full_path, (0, 0))
+    self.assertEqual(
+        'b1', vm_util.LoadJinjaTemplate(template_file.full_path).render(x=1)
+    )
+
+  def testCreateRemoteFile(self):
+    vm_util.CreateRemoteFile(self.mock_vm, 'a\nb', '/opt/dir/file')
+    self.mock_vm.RemoteCommand.assert_called_once_with(
+        '[ -d /opt/dir ] || mkdir -p /opt/dir && cat > /opt/dir/file',
+        stdin='a\nb',
+    )
+    self.mock_vm.PushFile.assert_not_called()
+
+  def testReadLocalFile(self):
+    temp_dir = self.create_tempdir()
+    temp_dir.create_file('metadata', content='caf\u00e9')
+    self.enter_context(
+        mock.patch.object(
+            vm_util, 'GetTempDir', return_value=temp_dir.full_path
+        )
+    )
+    with mock.patch.object(vm_util, 'IssueCommand') as issue_command:
+      self.assertEqual('caf\u00e9', vm_util.ReadLocalFile('metadata'))
+    issue_command.assert_not_called()
+
   def testDictionaryToEnvString(self):
     self.assertEqual('', vm_util.DictionaryToEnvString({}))
     test_dict = {'a': 'b', 'c': 'd'}